@@ -1,21 +1,28 @@
 from tabulate import tabulate
 
-import time
+from rate_limiter import SEARCH
 
 
 class RedmineToGitHub:
-    def __init__(self, gh, github_logins={}):
+    def __init__(self, gh, rate_limiter, github_logins={}):
         self._gh = gh
+        # Searches must go through the rate limiter of every other call on
+        # the client, which makes them one at a time.
+        self._rate_limiter = rate_limiter
         self._translation = github_logins
 
     def gh_login(self, redmine_username):
         return self._translation.get(redmine_username)
 
+    def record(self, redmine_username, login):
+        return self._translation.setdefault(redmine_username, login)
+
     def _search(self, query):
-        # To avoid rate limits
-        time.sleep(3)
-        users = self._gh.search_users(query)
-        return users[0].login if users.totalCount == 1 else None
+        # Only the first page is needed to decide whether the match is unique.
+        users = self._rate_limiter.call(
+            SEARCH, lambda: self._gh.search_users(query).get_page(0)
+        )
+        return users[0].login if len(users) == 1 else None
 
     def search_for_login(self, redmine_username, mail):
         login = self._translation.get(redmine_username, False)
@@ -25,11 +32,11 @@ class RedmineToGitHub:
         if mail is not None:
             login = self._search(f"{mail} in:email")
             if login is not None:
-                return self._translation.setdefault(redmine_username, login)
+                return self.record(redmine_username, login)
 
         # Either mail is None or lookup by mail failed.  Try with the fullname.
         login = self._search(f"fullname:{redmine_username}")
-        return self._translation.setdefault(redmine_username, login)
+        return self.record(redmine_username, login)
 
     def table(self):
         return tabulate(
@@ -0,0 +1,120 @@
+from github import UnknownObjectException
+
+from rate_limiter import CORE, SECONDARY
+from redmine_fetcher import stream
+
+from concurrent.futures import ThreadPoolExecutor
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+_CHUNK_SIZE = 1 << 16
+
+# GitHub replaces other characters of asset names with dots.
+_UNSAFE_NAME_CHARACTERS = re.compile(r"[^\w.-]")
+
+# Release of each repository to which the attachments are uploaded
+_RELEASE_TAG = "redmine-attachments"
+_RELEASE_NAME = "Redmine attachments"
+_RELEASE_MESSAGE = "Files attached to the issues migrated from Redmine."
+
+
+class AttachmentMigrator:
+    """Publishes the attachments of Redmine issues as GitHub release assets.
+
+    Each attachment is streamed from Redmine to a temporary file while its
+    SHA-256 digest is computed, then uploaded from that file to a release
+    of the target repository.  Contents are published once, whatever the
+    repository or the attachment they come from: the ledger maps each
+    Redmine attachment to its digest, and each digest to the URL of the
+    published file.  An attachment seen before is therefore not even
+    downloaded again.
+
+    Attachments are downloaded and uploaded on a pool of threads.
+    """
+
+    def __init__(
+        self, redmine, ledger, rate_limiter, workers=4, directory=None, chunk_size=_CHUNK_SIZE
+    ):
+        self._redmine = redmine
+        self._ledger = ledger
+        self._rate_limiter = rate_limiter
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._releases = {}  # Repository URL -> release
+        self._uploads = {}  # Digest -> lock held while the contents are uploaded
+
+    def close(self):
+        self._executor.shutdown()
+
+    def submit(self, repo, attachment):
+        """Starts publishing an attachment to the repository; returns a
+        future of the URL of the published file."""
+        return self._executor.submit(self._publish, repo, attachment)
+
+    def _publish(self, repo, attachment):
+        sha256 = self._ledger.attachment_sha256(attachment.id)
+        url = None if sha256 is None else self._ledger.asset_url(sha256)
+        if url is not None:
+            return url
+
+        fd, path = tempfile.mkstemp(dir=self._directory, suffix=".attachment")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                sha256 = self._download(attachment, f)
+            self._ledger.record_attachment(attachment.id, sha256)
+            return self._upload(repo, sha256, path, attachment)
+        finally:
+            os.remove(path)
+
+    def _download(self, attachment, f):
+        digest = hashlib.sha256()
+        for chunk in stream(self._redmine, attachment.content_url, self._chunk_size):
+            digest.update(chunk)
+            f.write(chunk)
+        return digest.hexdigest()
+
+    def _upload(self, repo, sha256, path, attachment):
+        # The same contents may be attached to issues that are prepared at
+        # the same time; only the first one uploads them.
+        with self._lock:
+            upload_lock = self._uploads.setdefault(sha256, threading.Lock())
+        with upload_lock:
+            url = self._ledger.asset_url(sha256)
+            if url is not None:
+                return url
+            name = _UNSAFE_NAME_CHARACTERS.sub(".", f"{sha256[:12]}-{attachment.filename}")
+            content_type = getattr(attachment, "content_type", None)
+            asset = self._rate_limiter.call(
+                SECONDARY,
+                self._release(repo).upload_asset,
+                path,
+                name=name,
+                content_type=content_type or "application/octet-stream",
+            )
+            self._ledger.record_asset(sha256, asset.browser_download_url)
+            return asset.browser_download_url
+
+    def _release(self, repo):
+        with self._lock:
+            release = self._releases.get(repo.url)
+            if release is not None:
+                return release
+            try:
+                release = self._rate_limiter.call(CORE, repo.get_release, _RELEASE_TAG)
+            except UnknownObjectException:
+                release = self._rate_limiter.call(
+                    SECONDARY,
+                    repo.create_git_release,
+                    _RELEASE_TAG,
+                    _RELEASE_NAME,
+                    _RELEASE_MESSAGE,
+                    prerelease=True,
+                )
+            self._releases[repo.url] = release
+            return release
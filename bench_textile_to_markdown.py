@@ -0,0 +1,204 @@
+#!/bin/env python3
+
+import textile_to_markdown as t2m
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+
+_WORDS = (
+    "the art framework module producer filter analyzer event run subrun "
+    "product lookup fails when configured with services in parallel mode "
+    "cetlib fhicl messagefacility canvas gallery build release"
+).split()
+
+
+def _sentence(rng):
+    words = rng.choices(_WORDS, k=rng.randint(5, 15))
+    if rng.random() < 0.3:
+        words[rng.randrange(len(words))] = f"*{rng.choice(_WORDS)}*"
+    if rng.random() < 0.2:
+        words[rng.randrange(len(words))] = f"_{rng.choice(_WORDS)}_"
+    if rng.random() < 0.2:
+        words.append(f"issue #{rng.randint(100, 99999)}")
+    if rng.random() < 0.1:
+        words.append(f"[{rng.randint(1, 9)}]")
+    if rng.random() < 0.1:
+        words.append(f"@{rng.choice(_WORDS)}()@")
+    if rng.random() < 0.05:
+        words.append(f'<code class="cpp">{rng.choice(_WORDS)}()</code>')
+    return " ".join(words).capitalize() + "."
+
+
+def _block(rng):
+    kind = rng.random()
+    if kind < 0.35:
+        return " ".join(_sentence(rng) for _ in range(rng.randint(1, 5)))
+    if kind < 0.5:
+        items = []
+        for _ in range(rng.randint(2, 6)):
+            marker = rng.choice(["*", "#"])
+            items.append(f"{marker} {_sentence(rng)}")
+            if rng.random() < 0.3:
+                items.append(f"{marker * 2} {_sentence(rng)}")
+        return "\n".join(items)
+    if kind < 0.6:
+        return f"h{rng.randint(1, 4)}. {_sentence(rng)}"
+    if kind < 0.7:
+        sha = "".join(rng.choices("0123456789abcdef", k=rng.choice([7, 40])))
+        ref = rng.choice([f"commit:{sha}", f"{rng.choice(_WORDS)}:commit:{sha}"])
+        return f"Fixed with {ref}, see {_sentence(rng)}"
+    if kind < 0.85:
+        lines = "\n".join(
+            f"  {rng.choice(_WORDS)}({rng.randint(0, 9)}); // {rng.choice(_WORDS)}"
+            for _ in range(rng.randint(3, 30))
+        )
+        return f'<pre><code class="{rng.choice(["cpp", "sh", "python"])}">\n{lines}\n</code></pre>'
+    if kind < 0.95:
+        lines = "\n".join(
+            f"%MSG-w {rng.choice(_WORDS)}: {_sentence(rng)}"
+            for _ in range(rng.randint(5, 50))
+        )
+        return f"<pre>\n{lines}\n</pre>"
+    if kind < 0.98:
+        return f"fn{rng.randint(1, 9)}. {_sentence(rng)}"
+    # Pathological input: unclosed tags and markers
+    return rng.choice(
+        [
+            f'<pre><code class="cpp">{_sentence(rng)}',
+            f"<pre>{_sentence(rng)}",
+            f"@{_sentence(rng)}",
+            f"*{_sentence(rng)} _{rng.choice(_WORDS)}",
+        ]
+    )
+
+
+def generate_corpus(size, seed=0):
+    """Returns a Redmine-like Textile text of at least size characters."""
+    rng = random.Random(seed)
+    blocks = []
+    length = 0
+    while length < size:
+        block = _block(rng)
+        blocks.append(block)
+        length += len(block) + 2
+    return "\n\n".join(blocks)
+
+
+def _best_time(function, repeat, number):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _fragments(text, prefix):
+    return [f for f in t2m._FIELDS.split(text) if f.startswith(prefix)]
+
+
+def _rules():
+    rules = t2m._LINE_RULES + [t2m._bold(t2m._IN_BOLD), t2m._italic(t2m._IN_ITALIC)]
+    return rules + t2m._REFERENCE_RULES
+
+
+def run(sizes, repeat):
+    """Returns {benchmark name: seconds per MB}."""
+    translator = t2m.TextileToMarkdown(None)
+    results = {}
+    for size in sizes:
+        text = generate_corpus(size)
+        mb = len(text.encode()) / 1e6
+        # Small inputs are converted repeatedly for a measurable time.
+        number = max(1, 100_000 // size)
+        normal = [
+            f
+            for f in t2m._FIELDS.split(text)
+            if not f.startswith(("<pre>", "@", "<code"))
+        ]
+        pre = _fragments(text, "<pre>")
+        code = _fragments(text, "<code")
+
+        benchmarks = {
+            "to_md": lambda: translator.to_md(text, "art"),
+            "to_md_normal": lambda: [t2m.to_md_normal(f, "art") for f in normal],
+            "to_md_pre": lambda: [t2m.to_md_pre(f) for f in pre],
+            "to_md_code": lambda: [t2m.to_md_code(f) for f in code],
+        }
+        if size <= 1_000_000:
+            # Cost of each rule on its own, over the text outside code
+            for name, pattern, replace in _rules():
+                rule = re.compile(pattern, re.MULTILINE)
+                benchmarks[f"rule:{name}"] = lambda rule=rule, replace=replace: [
+                    rule.sub(lambda m: replace(m, "art"), f) for f in normal
+                ]
+
+        for name, function in benchmarks.items():
+            seconds = _best_time(function, repeat, number)
+            results[f"{name}@{size}"] = seconds / mb
+            print(
+                f"{name:>20} {size:>9,d} B  {mb / seconds if seconds else float('inf'):10.2f} MB/s"
+            )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints and returns the benchmarks that are slower than the baseline
+    by more than the tolerance."""
+    regressions = []
+    for name, seconds_per_mb in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None or seconds_per_mb <= reference * (1 + tolerance):
+            continue
+        regressions.append(name)
+        print(f"  Regression in {name}: {seconds_per_mb / reference - 1:+.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Textile-to-Markdown converter on a synthetic corpus."
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=_SIZES[-1],
+        help="Largest corpus to convert, in bytes (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed runs; the fastest one is kept (default: %(default)s).",
+    )
+    parser.add_argument("--save", help="Save the results as a baseline in this file.")
+    parser.add_argument(
+        "--compare", help="Compare the results with a baseline saved with --save."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Slowdown relative to the baseline that is reported (default: %(default)s).",
+    )
+
+    args = parser.parse_args()
+    results = run([size for size in _SIZES if size <= args.max_size], args.repeat)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+        print("No regressions.")
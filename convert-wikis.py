@@ -0,0 +1,74 @@
+#!/bin/env python3
+
+from termcolor import colored
+
+from textile_to_markdown import TextileToMarkdown
+from repositories_to_migrate import FNAL_REDMINE_REPOS, GITHUB_ORG
+
+import argparse
+import glob
+import os
+
+_TEXTILE_TO_MARKDOWN = TextileToMarkdown(GITHUB_ORG)
+
+_GREEN_CHECKMARK = colored("\u2714", "green")
+
+
+def convert_file(textile_path, md_path, repo):
+    # Written next to the final file, then moved into place, so that an
+    # interrupted conversion never leaves a truncated Markdown file behind.
+    tmp_path = f"{md_path}.tmp"
+    with open(textile_path, encoding="utf-8", newline="") as textile:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as md:
+            md.writelines(_TEXTILE_TO_MARKDOWN.to_md_stream(textile, repo))
+    os.replace(tmp_path, md_path)
+
+
+def convert_wikis_of(parsed_args, redmine_repo):
+    textile_paths = sorted(glob.glob(f"./redmine/{redmine_repo}/*.textile"))
+    gh_repo = redmine_repo.replace("_", "-")
+
+    n_converted = 0
+    for textile_path in textile_paths:
+        md_path = textile_path[: -len(".textile")] + ".md"
+        if (
+            not parsed_args.force
+            and os.path.exists(md_path)
+            and os.path.getmtime(md_path) >= os.path.getmtime(textile_path)
+        ):
+            continue
+        convert_file(textile_path, md_path, gh_repo)
+        n_converted += 1
+
+    print(
+        f"  {_GREEN_CHECKMARK} Converted {n_converted} of {len(textile_paths)} {redmine_repo} wiki pages"
+    )
+
+
+def convert(parsed_args):
+    for repo in parsed_args.repos or FNAL_REDMINE_REPOS:
+        if os.path.isdir(f"./redmine/{repo}"):
+            convert_wikis_of(parsed_args, repo)
+
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert wiki pages saved by download-wikis.py to Markdown."
+    )
+    parser.add_argument(
+        "repos",
+        nargs="*",
+        help="Redmine projects to convert (default: all projects to migrate).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert pages again even if their Markdown file is up to date.",
+    )
+
+    args = parser.parse_args()
+    convert(args)
+
+    print("Conversion was successful.")
@@ -8,6 +8,9 @@ from termcolor import colored
 import settings
 import github_translation as translate
 from RedmineToGitHub import RedmineToGitHub
+from redmine_fetcher import RedmineFetcher
+from redmine_snapshot import RedmineSnapshot, SnapshotFetcher
+from wiki_downloader import WikiDownloader
 
 from textile_to_markdown import TextileToMarkdown
 from repositories_to_migrate import FNAL_REDMINE_REPOS, GITHUB_ORG
@@ -25,14 +28,11 @@ _RED_HEAVY_BALLOT_X = colored("\u2718", "red")
 _YELLOW_CIRCLE_BULLET = colored("\u25cf", "yellow")
 
 
-def download_wikis_from(redmine, parsed_args, redmine_repo):
+def download_wikis_from(fetcher, downloader, parsed_args, redmine_repo):
     #redmine_wikis = redmine.project.get(redmine_repo).wiki_pages
-    redmine_wikis = redmine.wiki_page.filter(project_id=redmine_repo)
+    redmine_wikis = list(fetcher.wiki_pages(redmine_repo))
+    project_directory = f"./redmine/{redmine_repo}"
 
-    if not os.path.isdir(f"./redmine/{redmine_repo}"):
-        os.mkdir(f"./redmine/{redmine_repo}")
-
-    n_migrated_issues = 0
     n_wikis = len(redmine_wikis)
     width = len(str(n_wikis))
 
@@ -41,21 +41,23 @@ def download_wikis_from(redmine, parsed_args, redmine_repo):
         return
 
     if parsed_args.dry_run:
+        stale_pages, stale_attachments, _, _ = downloader.plan(
+            project_directory, redmine_wikis
+        )
         print(
-            f"\nWould download {n_wikis} {redmine_repo} wiki pages from Redmine"
+            f"\nWould download {len(stale_pages)} of {n_wikis} {redmine_repo} wiki pages"
+            f" and {len(stale_attachments)} attachments from Redmine"
         )
-    else:
-        print(f"\nDownloading {n_wikis} {redmine_repo} wiki pages from Redmine")
+        return 0, n_wikis
 
-    for i, wiki in enumerate(reversed(redmine_wikis)):
-        wiki.export("txt", savepath=f"./redmine/{redmine_repo}", filename=f"{wiki.title}.textile")
-        if len(wiki.attachments) > 0:
-            print(f"\tDownloading {len(wiki.attachments)} attachments from {wiki.title}")
-            for attachment in wiki.attachments:
-                attachment.download(savepath=f"./redmine/{redmine_repo}")
-        n_migrated_issues += 1
+    print(f"\nDownloading {n_wikis} {redmine_repo} wiki pages from Redmine")
+    n_pages, n_attachments = downloader.download(project_directory, redmine_wikis)
+    print(
+        f"  {_GREEN_CHECKMARK} Downloaded {n_pages} pages and {n_attachments} attachments"
+        f" ({n_wikis - n_pages} pages were up to date)"
+    )
 
-    return n_migrated_issues, n_wikis
+    return n_pages, n_wikis
 
 
 def migrate(parsed_args):
@@ -68,8 +70,15 @@ def migrate(parsed_args):
     if not os.path.isdir("./redmine"):
         os.mkdir("./redmine")
 
+    fetcher = (
+        RedmineFetcher(redmine)
+        if parsed_args.snapshot is None
+        else SnapshotFetcher(redmine, RedmineSnapshot(parsed_args.snapshot))
+    )
+
+    downloader = WikiDownloader(redmine, workers=parsed_args.workers)
     for repo in FNAL_REDMINE_REPOS:
-        download_wikis_from(redmine, parsed_args, repo)
+        download_wikis_from(fetcher, downloader, parsed_args, repo)
 
     print()
 
@@ -100,6 +109,16 @@ if __name__ == "__main__":
         action="store_true",
         help="Show what information would be published to GitHub.",
     )
+    parser.add_argument(
+        "--snapshot",
+        help="Read wiki metadata from a snapshot made with snapshot-redmine.py.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of pages and attachments to download concurrently (default: %(default)s).",
+    )
 
     args = parser.parse_args()
     migrate(args)
@@ -0,0 +1,161 @@
+from redminelib import Redmine
+from redminelib.exceptions import ResourceNotFoundError, ServerError
+
+from urllib.parse import urlparse
+
+import re
+
+_URL = "https://redmine.example.com/"
+_CLOSED = 5  # Redmine status id
+_STATUSES = {1: "New", _CLOSED: "Closed"}
+
+
+def _split(value):
+    # python-redmine sends lists, e.g. of includes, as comma-separated text.
+    if isinstance(value, str):
+        return value.split(",")
+    return list(value)
+
+
+class FakeRedmine:
+    """Stand-in for the parts of Redmine's REST API that the migration
+    uses, for tests.
+
+    client is a python-redmine client whose requests are served from the
+    projects and issues of the fake instead of over HTTP.  Every request is
+    recorded in requests as (method, path, params).  The next update of an
+    issue whose id is in failing_updates fails with a server error; the
+    update is not applied.
+    """
+
+    def __init__(self):
+        self.projects = {}  # Identifier -> project
+        self.issues = {}  # Issue id -> issue, without its journals
+        self.journals = {}  # Issue id -> journals
+        self.requests = []
+        self.failing_updates = set()
+        self.client = Redmine(_URL)
+        self.client.engine.request = self._request
+
+    def add_project(self, identifier, project_id):
+        self.projects[identifier] = {
+            "id": project_id,
+            "name": identifier.capitalize(),
+            "identifier": identifier,
+        }
+
+    def add_issue(self, issue_id, project, relations=(), notes=()):
+        """Adds an open issue to the project with that identifier.  relations
+        are the ids of the issues it relates to, and notes the texts of its
+        comments."""
+        self.issues[issue_id] = {
+            "id": issue_id,
+            "project": {"id": self.projects[project]["id"], "name": project},
+            "tracker": {"id": 1, "name": "Bug"},
+            "status": {"id": 1, "name": _STATUSES[1]},
+            "priority": {"id": 2, "name": "Normal"},
+            "author": {"id": 7, "name": "Jane Doe"},
+            "subject": f"Issue {issue_id}",
+            "description": f"Description of issue {issue_id}",
+            "created_on": "2020-01-01T00:00:00Z",
+            "updated_on": "2020-01-02T00:00:00Z",
+            "relations": [
+                {
+                    "id": issue_id * 1000 + to_id,
+                    "issue_id": issue_id,
+                    "issue_to_id": to_id,
+                    "relation_type": "relates",
+                }
+                for to_id in relations
+            ],
+        }
+        self.journals[issue_id] = [
+            {
+                "id": issue_id * 1000 + i,
+                "user": {"id": 7, "name": "Jane Doe"},
+                "notes": text,
+                "created_on": "2020-01-03T00:00:00Z",
+            }
+            for i, text in enumerate(notes)
+        ]
+
+    def listings(self):
+        """Returns the parameters of the requests that listed the issues of
+        a project."""
+        return [
+            params
+            for method, path, params in self.requests
+            if path == "/issues.json" and "project_id" in params
+        ]
+
+    def _request(self, method, url, headers=None, params=None, data=None):
+        path = urlparse(url).path
+        params = dict(params or {})
+        self.requests.append((method, path, params))
+
+        m = re.fullmatch(r"/projects/([\w-]+)\.json", path)
+        if m is not None and m[1] in self.projects:
+            return {"project": self.projects[m[1]]}
+        if path == "/issues.json":
+            return self._list(params)
+        m = re.fullmatch(r"/issues/(\d+)\.json", path)
+        if m is not None and int(m[1]) in self.issues:
+            if method == "put":
+                return self._update(int(m[1]), data["issue"])
+            return {"issue": self._issue(int(m[1]), _split(params.get("include", [])))}
+        m = re.fullmatch(r"/users/(\d+)\.json", path)
+        if m is not None:
+            return {"user": {"id": int(m[1]), "firstname": "Jane", "lastname": "Doe"}}
+        raise ResourceNotFoundError
+
+    def _issue(self, issue_id, include):
+        issue = {k: v for k, v in self.issues[issue_id].items() if k != "relations"}
+        if "relations" in include:
+            issue["relations"] = self.issues[issue_id]["relations"]
+        if "journals" in include:
+            issue["journals"] = self.journals[issue_id]
+        # Redmine omits empty collections.
+        return {k: v for k, v in issue.items() if v != []}
+
+    def _list(self, params):
+        issues = sorted(self.issues.values(), key=lambda issue: issue["id"])
+        if params.get("sort") != "id":
+            issues.reverse()  # Newest first, like Redmine
+        if "issue_id" in params:
+            ids = {int(i) for i in _split(str(params["issue_id"]))}
+            issues = [issue for issue in issues if issue["id"] in ids]
+        if "project_id" in params:
+            # The fake has no subprojects.
+            issues = [i for i in issues if i["project"]["id"] == params["project_id"]]
+        if params.get("status_id") != "*":
+            issues = [issue for issue in issues if issue["status"]["id"] != _CLOSED]
+
+        offset = params.get("offset", 0)
+        limit = params.get("limit", 25)
+        include = _split(params.get("include", []))
+        return {
+            "issues": [
+                self._issue(issue["id"], include) for issue in issues[offset : offset + limit]
+            ],
+            "total_count": len(issues),
+            "offset": offset,
+            "limit": limit,
+        }
+
+    def _update(self, issue_id, changes):
+        if issue_id in self.failing_updates:
+            self.failing_updates.discard(issue_id)
+            raise ServerError
+        if "status_id" in changes:
+            status_id = changes["status_id"]
+            self.issues[issue_id]["status"] = {"id": status_id, "name": _STATUSES[status_id]}
+        if changes.get("notes"):
+            self.journals[issue_id].append(
+                {
+                    "id": issue_id * 1000 + len(self.journals[issue_id]),
+                    "user": {"id": 1, "name": "Migration"},
+                    "notes": changes["notes"],
+                    "created_on": "2020-01-04T00:00:00Z",
+                }
+            )
+        return True
@@ -0,0 +1,108 @@
+from github import GithubException
+
+from rate_limiter import GRAPHQL
+
+_PAGE_SIZE = 100  # Largest page GitHub serves
+
+_ISSUES = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    issues(first: $first, after: $after, orderBy: {field: CREATED_AT, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { number title url body }
+    }
+  }
+}
+"""
+
+_MEMBERS = """
+query($login: String!, $first: Int!, $after: String) {
+  organization(login: $login) {
+    membersWithRole(first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes { login }
+    }
+  }
+}
+"""
+
+# GraphQL errors come with a 200 status; they are raised with the status
+# the REST API would have answered.
+_ERROR_STATUSES = {"RATE_LIMITED": 403, "NOT_FOUND": 404, "FORBIDDEN": 403}
+
+
+def _requester(gh):
+    # PyGithub 1.55 has no GraphQL support, nor a public accessor for the
+    # requester of a client.  Its requester still authenticates the request
+    # and records the rate-limit headers of the response, like for any
+    # other call on the client.
+    return gh._Github__requester
+
+
+class GitHubGraphQL:
+    """Reads issues and organization members through the GraphQL API.
+
+    The REST API lists 30 issues per request, each with its author, labels,
+    milestone and so on.  A GraphQL request lists 100, with only the fields
+    that are asked for.  Listings are paged with cursors; the cursor after a
+    page can be kept to later resume the listing from there.
+    """
+
+    def __init__(self, github_org, rate_limiter, page_size=_PAGE_SIZE):
+        self._github_org = github_org
+        self._rate_limiter = rate_limiter
+        self._page_size = page_size
+
+    def _request(self, query, variables):
+        # Made through the rate limiter, which also keeps other threads
+        # from using the requester of the client at the same time.
+        headers, data = _requester(self._github_org.gh).requestJsonAndCheck(
+            "POST", "/graphql", input={"query": query, "variables": variables}
+        )
+        errors = data.get("errors")
+        if errors:
+            status = _ERROR_STATUSES.get(errors[0].get("type"), 400)
+            raise GithubException(status, dict(data, message=errors[0]["message"]), headers)
+        return data["data"]
+
+    def _pages(self, query, connection, after, **variables):
+        while True:
+            data = self._rate_limiter.call(
+                GRAPHQL,
+                self._request,
+                query,
+                dict(variables, first=self._page_size, after=after),
+            )
+            for field in connection:
+                data = data[field]
+            # An empty page has no cursor; the listing resumes where it was.
+            after = data["pageInfo"]["endCursor"] or after
+            yield data["nodes"], after
+            if not data["pageInfo"]["hasNextPage"]:
+                return
+
+    def issue_pages(self, repo_name, after=None):
+        """Yields (issues, cursor) pages of the issues of a repository of the
+        organization, whatever their state, oldest first.  Each issue is a
+        dict of its number, title, url and body.  Listing resumes after the
+        cursor, if any."""
+        return self._pages(
+            _ISSUES,
+            ("repository", "issues"),
+            after,
+            owner=self._github_org.login,
+            name=repo_name,
+        )
+
+    def members(self):
+        """Returns the logins of the members of the organization."""
+        return [
+            member["login"]
+            for members, _ in self._pages(
+                _MEMBERS,
+                ("organization", "membersWithRole"),
+                None,
+                login=self._github_org.login,
+            )
+            for member in members
+        ]
@@ -0,0 +1,133 @@
+from rate_limiter import CORE, SECONDARY
+
+import time
+
+# The issue import API is only served with its preview media type.
+_IMPORT_MEDIA_TYPE = "application/vnd.github.golden-comet-preview+json"
+
+
+class IssueImporter:
+    """Creates GitHub issues together with their comments in one request.
+
+    Issues are submitted to the issue import API
+    (POST /repos/{owner}/{repo}/import/issues), which processes them
+    asynchronously.  Submitted imports are polled in batches: a single
+    request per repository returns the status of every import submitted
+    since a given date.
+
+    Each import is recorded in the ledger as soon as it is submitted.  An
+    issue whose import was submitted by an interrupted run is not submitted
+    again; its import is polled instead.  Imports that are still pending
+    when the timeout expires are reported as failed, but stay recorded, so
+    that the next run polls them again.
+    """
+
+    def __init__(
+        self,
+        rate_limiter,
+        ledger,
+        batch_size=25,
+        poll_interval=1.0,
+        timeout=600.0,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        self._rate_limiter = rate_limiter
+        self._ledger = ledger
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._timeout = timeout
+        self._sleep = sleep
+        self._clock = clock
+        self._pending = []  # (repo, import id, submission date, Redmine id, context)
+
+    def _request(self, resource, repo, verb, url, **kwargs):
+        _, data = self._rate_limiter.call(
+            resource,
+            repo._requester.requestJsonAndCheck,
+            verb,
+            url,
+            headers={"Accept": _IMPORT_MEDIA_TYPE},
+            **kwargs,
+        )
+        return data
+
+    def submit(self, repo, redmine_id, title, body, labels, assignee, comments, context):
+        """Submits the import of a Redmine issue, unless an earlier run
+        already submitted it to the repository.  Returns whether the import
+        was submitted."""
+        submitted = self._ledger.submitted_import(redmine_id)
+        if submitted is not None and submitted[0] == repo.url:
+            _, import_id, date = submitted
+            self._pending.append((repo, import_id, date, redmine_id, context))
+            return False
+
+        issue = {"title": title, "body": body, "labels": labels, "closed": False}
+        if assignee is not None:
+            issue["assignee"] = assignee
+        payload = {"issue": issue, "comments": [{"body": c} for c in comments]}
+        data = self._request(
+            SECONDARY, repo, "POST", f"{repo.url}/import/issues", input=payload
+        )
+        date = data["created_at"][:10]
+        self._ledger.record_import(redmine_id, repo.url, data["id"], date)
+        self._pending.append((repo, data["id"], date, redmine_id, context))
+        return True
+
+    def full(self):
+        return len(self._pending) >= self._batch_size
+
+    def _poll(self, repo, since):
+        return self._request(
+            CORE,
+            repo,
+            "GET",
+            f"{repo.url}/import/issues",
+            parameters={"since": since},
+        )
+
+    def wait(self):
+        """Waits for all submitted imports and returns, in submission order,
+        (context, issue number, errors) tuples.  The issue number is None if
+        the import failed or did not complete in time."""
+        results = {}
+        failed = set()
+        interval = self._poll_interval
+        deadline = self._clock() + self._timeout
+        while True:
+            waiting = [p for p in self._pending if (p[0].url, p[1]) not in results]
+            if not waiting:
+                break
+            if self._clock() >= deadline:
+                for repo, import_id, *_ in waiting:
+                    results[repo.url, import_id] = (
+                        None,
+                        [f"Import {import_id} still pending after {self._timeout:.0f} seconds"],
+                    )
+                break
+
+            since = {}
+            for repo, _, date, *_ in waiting:
+                since[repo.url] = (repo, min(date, since.get(repo.url, (None, date))[1]))
+            for repo, date in since.values():
+                for status in self._poll(repo, date):
+                    if status["status"] == "imported":
+                        number = int(status["issue_url"].rsplit("/", 1)[1])
+                        results[repo.url, status["id"]] = (number, [])
+                    elif status["status"] == "failed":
+                        results[repo.url, status["id"]] = (None, status.get("errors", []))
+                        failed.add((repo.url, status["id"]))
+
+            if any((p[0].url, p[1]) not in results for p in self._pending):
+                self._sleep(interval)
+                interval = min(2 * interval, 30.0)
+
+        done = []
+        for repo, import_id, _, redmine_id, context in self._pending:
+            number, errors = results[repo.url, import_id]
+            if (repo.url, import_id) in failed:
+                # The next run submits the issue again.
+                self._ledger.forget_import(redmine_id)
+            done.append((context, number, errors))
+        self._pending = []
+        return done
@@ -0,0 +1,105 @@
+from github_graphql import GitHubGraphQL
+from rate_limiter import CORE
+
+import json
+import os
+import threading
+import time
+
+_DAY = 24 * 60 * 60
+
+
+class GitHubOrg:
+    """GitHub organization that is only looked up when first needed.
+
+    Neither the organization, its repositories nor its member list are
+    requested until they are used, and then only once, so that importing
+    the migration script, showing its help or making a dry run costs no
+    GitHub request.  When offline, GitHub is never contacted: the members
+    are then only known from a saved snapshot, if any.
+
+    The member list is read through the GraphQL API, 100 members per
+    request.  It can be saved to a file, from which it is read again as
+    long as it is younger than the TTL.
+    """
+
+    def __init__(
+        self, gh, login, rate_limiter, members_path=None, ttl=_DAY, clock=time.time
+    ):
+        self.login = login
+        self.members_path = members_path
+        self.offline = False
+        self._gh = gh
+        self._rate_limiter = rate_limiter
+        self._ttl = ttl
+        self._clock = clock
+        self._org = None
+        self._repos = {}  # Name -> repository
+        self._members = None
+        # Looking a repository up may look the organization up as well.
+        self._lock = threading.RLock()
+        self.graphql = GitHubGraphQL(self, rate_limiter)
+
+    @property
+    def gh(self):
+        if self.offline:
+            raise RuntimeError("GitHub must not be contacted when offline")
+        return self._gh
+
+    @property
+    def org(self):
+        with self._lock:
+            if self._org is None:
+                self._org = self._rate_limiter.call(
+                    CORE, self.gh.get_organization, self.login
+                )
+            return self._org
+
+    def get_repo(self, name):
+        """Returns a repository of the organization, which is only requested
+        the first time."""
+        with self._lock:
+            if name not in self._repos:
+                self._repos[name] = self._rate_limiter.call(CORE, self.org.get_repo, name)
+            return self._repos[name]
+
+    def _load_members(self):
+        if self.members_path is None:
+            return None
+        try:
+            with open(self.members_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        if snapshot["org"] != self.login:
+            return None
+        if not self.offline and self._clock() - snapshot["listed_on"] > self._ttl:
+            return None
+        return frozenset(snapshot["members"])
+
+    def _save_members(self):
+        if self.members_path is None:
+            return
+        tmp_path = f"{self.members_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "org": self.login,
+                    "listed_on": self._clock(),
+                    "members": sorted(self._members),
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.members_path)
+
+    def members(self):
+        """Returns the set of member logins, or None if they are unknown
+        because GitHub cannot be contacted."""
+        with self._lock:
+            if self._members is None:
+                self._members = self._load_members()
+            if self._members is None and not self.offline:
+                self._members = frozenset(self.graphql.members())
+                self._save_members()
+            return self._members
@@ -7,33 +7,94 @@ from termcolor import colored
 import settings
 import github_translation as translate
 from RedmineToGitHub import RedmineToGitHub
-
-from textile_to_markdown import TextileToMarkdown
+from redmine_closer import RedmineCloser
+from redmine_fetcher import RedmineFetcher
+from redmine_snapshot import RedmineSnapshot, SnapshotFetcher
+from migration_ledger import MigrationLedger
+from migration_plan import MigrationPlan
+from attachment_migrator import AttachmentMigrator
+from github_importer import IssueImporter
+from github_org import GitHubOrg
+from pipeline import Stage, batched, flattened
+from user_cache import UserCache
+from rate_limiter import RateLimiter, CORE, SEARCH, SECONDARY
+
+from textile_to_markdown import ConversionCache, TextileToMarkdown
 from repositories_to_migrate import FNAL_REDMINE_REPOS, GITHUB_ORG, GITHUB_ORG_REPOS
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from requests import RequestException
+
 import argparse
-import time
+import io
+import multiprocessing
+import re
+import sys
+import threading
 
 _FNAL_REDMINE_URL = "https://cdcvs.fnal.gov/redmine/"
+_USER_RESOLVERS = 8
+
+# Concurrency of the stages that prepare issues for publishing
+_FETCH_WORKERS = 4
+_PREPARE_WORKERS = 2
+_PREPARE_BATCH = 16
 
+# Creating the client makes no request; the organization and its members
+# are looked up on first use.
 _GH = Github(login_or_token=settings.GITHUB_LOGIN_OR_TOKEN)
-_GH_ORG = _GH.get_organization(GITHUB_ORG)
-_GH_ORG_MEMBERS = list(map(lambda e: e.login, _GH_ORG.get_members()))
+_RATE_LIMITER = RateLimiter(_GH)
+_GH_ORG = GitHubOrg(_GH, GITHUB_ORG, _RATE_LIMITER)
+
+_REDMINE_TO_GITHUB = RedmineToGitHub(_GH, _RATE_LIMITER, translate.users)
+_CONVERSION_CACHE = ConversionCache()
+_TEXTILE_TO_MARKDOWN = TextileToMarkdown(GITHUB_ORG, _CONVERSION_CACHE)
+_USER_CACHE = UserCache("github_users_cache.json")
+
+_PENDING_ISSUES = {}  # Redmine issue id -> _PendingIssue
+_PENDING_ISSUES_LOCK = threading.Lock()
 
-_REDMINE_TO_GITHUB = RedmineToGitHub(_GH, translate.users)
-_TEXTILE_TO_MARKDOWN = TextileToMarkdown(GITHUB_ORG)
+_DEPENDENCY_HEADINGS = ("\n***Subtasks:***", "\n***Related issues:***")
 
-_ISSUES_WITH_SUBTASKS = {}
-_ISSUES_WITH_RELATIONS = {}
-_GH_ISSUES = {}
+# Start of the body of every issue migrated by this script
+_MIGRATED_FROM = re.compile(
+    re.escape(f"*This issue has been migrated from {_FNAL_REDMINE_URL}issues/") + r"(\d+)\b"
+)
 
 _GREEN_CHECKMARK = colored("\u2714", "green")
 _RED_HEAVY_BALLOT_X = colored("\u2718", "red")
 _YELLOW_CIRCLE_BULLET = colored("\u25cf", "yellow")
 
 
-def redmine_issue_url(issue):
-    return f"{_FNAL_REDMINE_URL}issues/{issue.id}"
+def redmine_issue_url(issue_id):
+    return f"{_FNAL_REDMINE_URL}issues/{issue_id}"
+
+
+class _PendingIssue:
+    """Migrated issue whose dependency links remain to be verified.
+
+    Only ids are kept until the verification phase; the Redmine and GitHub
+    issues are fetched again when they are verified.
+    """
+
+    __slots__ = (
+        "redmine_id",
+        "status_id",
+        "gh_repo",
+        "number",
+        "html_url",
+        "subtasks",
+        "relations",
+    )
+
+    def __init__(self, redmine_id, status_id, gh_repo, number, html_url, subtasks, relations):
+        self.redmine_id = redmine_id
+        self.status_id = status_id
+        self.gh_repo = gh_repo
+        self.number = number
+        self.html_url = html_url
+        self.subtasks = tuple(subtasks)  # Redmine issue ids
+        self.relations = tuple(relations)  # Redmine issue ids
 
 
 def concat_mds(*mds):
@@ -50,59 +111,173 @@ def concat_mds(*mds):
     return result
 
 
-def guarded_gh_call(gh_method, *args, **kwargs):
-    attempt = 0
-    n = 4
-    while attempt < n:
-        try:
-            time.sleep(2.5)  # Attempt to avoid GitHub's API limits
-            return gh_method(*args, **kwargs)
-        except GithubException as e:
-            attempt += 1
-            if attempt == n or e.status != 403:
-                raise e
-            message = e.data["message"]
-            if message.startswith(
-                "You have exceeded a secondary rate limit"
-            ) or message.startswith("API rate limit exceeded"):
-                print(" \n   Waiting 15 minutes due to rate limit...\n")
-                time.sleep(900)
-            else:
-                raise e
+def dependencies_md(subtasks, relations, link):
+    result = ""
+    for heading, dependencies in zip(_DEPENDENCY_HEADINGS, (subtasks, relations)):
+        if dependencies:
+            result += heading
+            for d in dependencies:
+                result += "\n- " + link(d)
+    return result
 
-def gh_issues(repo):
-    issues = guarded_gh_call(repo.get_issues)
-    issue_dict = {}
-    for issue in issues:
-      issue_dict[issue.title] = issue.number
 
-    return issue_dict
+def attachments_md(urls):
+    links = [f"- [{name}]({url})" for name, url in urls.items() if url is not None]
+    return "***Attachments:***\n" + "\n".join(links) if links else ""
+
+
+def with_dependencies(body, dependencies):
+    # Replaces the dependency section written by an earlier run, if any.
+    for heading in _DEPENDENCY_HEADINGS:
+        index = body.find("\n\n----\n\n" + heading)
+        if index != -1:
+            body = body[:index]
+            break
+    return concat_mds(body, dependencies)
+
+
+def guarded_gh_call(gh_method, *args, resource=CORE, **kwargs):
+    return _RATE_LIMITER.call(resource, gh_method, *args, **kwargs)
+
+
+def n_comments(issue):
+    return sum(1 for journal in issue.journals if getattr(journal, "notes", None))
+
+
+def adopt_gh_issues(fetcher, ledger, gh_repo):
+    # Issues migrated before the ledger existed are recognized by the link
+    # to their Redmine issue, whatever their state.  They were migrated
+    # together with all their comments.  Issues listed by an earlier run
+    # are not listed again.
+    pages = _GH_ORG.graphql.issue_pages(gh_repo, after=ledger.issue_cursor(gh_repo))
+    for gh_issues, cursor in pages:
+        adopted = {}
+        for gh_issue in gh_issues:
+            match = _MIGRATED_FROM.match(gh_issue["body"] or "")
+            if match is not None and ledger.get(int(match[1])) is None:
+                adopted.setdefault(int(match[1]), gh_issue)
+        fetcher.prefetch_issues(adopted)
+        for redmine_id, gh_issue in adopted.items():
+            issue = fetcher.issue(redmine_id)
+            if issue is not None:
+                ledger.record_issue(
+                    redmine_id,
+                    gh_repo,
+                    gh_issue["number"],
+                    gh_issue["url"],
+                    comments_posted=n_comments(fetcher.populate(issue)),
+                )
+        if cursor is not None:
+            ledger.record_issue_cursor(gh_repo, cursor)
 
-def gh_login_or_not_set(redmine, user):
+def gh_login_or_not_set(fetcher, user):
     login = _REDMINE_TO_GITHUB.gh_login(user.name)
     if login is not None:
         return login
 
-    redmine_user = None
-    try:
-        redmine_user = redmine.user.get(user.id)
-    except ResourceNotFoundError:
-        return GithubObject.NotSet
+    cached = _USER_CACHE.get(user.id)
+    if cached is not None:
+        login = _REDMINE_TO_GITHUB.record(user.name, cached["login"])
+    elif _GH_ORG.offline:
+        # Unknown users are left unresolved rather than searched for.
+        login = None
+    else:
+        try:
+            redmine_user = fetcher.user(user.id)
+        except ResourceNotFoundError:
+            login = None
+        else:
+            email = getattr(redmine_user, "mail", None)
+            login = _REDMINE_TO_GITHUB.search_for_login(user.name, email)
+        _USER_CACHE.put(user.id, user.name, login)
 
-    email = getattr(redmine_user, "mail", None)
-    login = _REDMINE_TO_GITHUB.search_for_login(user.name, email)
     return GithubObject.NotSet if login is None else login
 
 
-def at_gh_login_or_name(redmine, user):
-    login = gh_login_or_not_set(redmine, user)
+def at_gh_login_or_name(fetcher, user):
+    login = gh_login_or_not_set(fetcher, user)
     if login is GithubObject.NotSet:
         return user.name
 
     return "@" + login
 
 
-def issue_comments(redmine, journals, gh_repo):
+def mentioned_users(users, issue, with_comments=True):
+    # Adds the users that the migration of an issue mentions to users, by
+    # id.  Listed issues have no journals, so the authors of their comments
+    # are only known once the issues are fetched.
+    users.setdefault(issue.author.id, issue.author)
+    assigned_to = getattr(issue, "assigned_to", None)
+    if assigned_to is not None:
+        users.setdefault(assigned_to.id, assigned_to)
+    if with_comments:
+        for journal in issue.journals:
+            if getattr(journal, "notes", None):
+                users.setdefault(journal.user.id, journal.user)
+
+
+def resolve_users(fetcher, users):
+    # Resolve each user once, so that the migration itself only looks up
+    # known logins.  The threads overlap their Redmine requests; their
+    # GitHub searches are made one at a time by the shared rate limiter.
+    with ThreadPoolExecutor(max_workers=_USER_RESOLVERS) as executor:
+        for _ in executor.map(lambda user: gh_login_or_not_set(fetcher, user), users.values()):
+            pass
+    return len(users)
+
+
+def issue_texts(issue):
+    return [issue.description] + [
+        journal.notes for journal in issue.journals if getattr(journal, "notes", None)
+    ]
+
+
+def published_urls(published):
+    urls = {}
+    for name, future in published:
+        try:
+            urls[name] = future.result()
+        except (RequestException, GithubException, OSError):
+            # E.g. the temporary file could not be written.
+            urls[name] = None
+    return urls
+
+
+def prepare_issues(fetcher, ledger, executor, attachments, repo, gh_repo, redmine_issues):
+    # Resolve the users, publish the attachments and convert the texts of a
+    # batch of issues, so that publishing them only takes lookups.
+    published = {}
+    if attachments is not None:
+        for issue in redmine_issues:
+            entry = ledger.get(issue.id)
+            if entry is None or entry.comments_posted < n_comments(issue):
+                published[issue.id] = [
+                    (a.filename, attachments.submit(repo, a)) for a in issue.attachments
+                ]
+    # Most users were resolved before the migration; the authors of
+    # comments may not have been.
+    users = {}
+    for issue in redmine_issues:
+        mentioned_users(users, issue)
+    resolve_users(fetcher, users)
+    texts = [text for issue in redmine_issues for text in issue_texts(issue)]
+    converted = dict(
+        zip(texts, _TEXTILE_TO_MARKDOWN.to_md_many(texts, gh_repo, executor))
+    )
+
+    prepared = []
+    for issue in redmine_issues:
+        # Attachments are published with names of their own.
+        urls = published_urls(published.get(issue.id, []))
+        markdown = {
+            text: _TEXTILE_TO_MARKDOWN.link_attachments(converted[text], urls)
+            for text in issue_texts(issue)
+        }
+        prepared.append((issue, markdown, urls))
+    return prepared
+
+
+def issue_comments(fetcher, journals, markdown):
     result = []
     for journal in journals:
         if not hasattr(journal, "notes"):
@@ -110,36 +285,186 @@ def issue_comments(redmine, journals, gh_repo):
         if not journal.notes:
             continue
 
-        username = at_gh_login_or_name(redmine, journal.user)
+        username = at_gh_login_or_name(fetcher, journal.user)
         header = f"*Comment by {username} on {journal.created_on}*"
         result.append(
-            concat_mds(header, _TEXTILE_TO_MARKDOWN.to_md(journal.notes, gh_repo))
+            concat_mds(header, markdown[journal.notes])
         )
     return result
 
 
+def search_gh_issues(query):
+    # Only the first page is needed to decide whether the match is unique.
+    return guarded_gh_call(
+        lambda: _GH_ORG.gh.search_issues(query).get_page(0), resource=SEARCH
+    )
+
+
 def search_for_issue(title, query):
-    # To avoid rate limits
-    time.sleep(2.5)
-    issues = _GH.search_issues(query)
+    issues = search_gh_issues(query)
     trimmed_issues = [issue for issue in issues if issue.title == title]
     return trimmed_issues[0] if len(trimmed_issues) == 1 else None
 
 
-def migrate_issues_from(redmine, parsed_args, redmine_repo, gh_repo):
-    redmine_issues = redmine.project.get(redmine_repo).issues
-    project_name = redmine.project.get(redmine_repo).name
+def plan_issue_numbers(plan, ledger, gh_repo, redmine_ids):
+    repo = _GH_ORG.get_repo(gh_repo)
+    # Issues and pull requests share the numbering of a repository.
+    latest = guarded_gh_call(
+        lambda: repo.get_issues(state="all", sort="created", direction="desc").get_page(0)
+    )
+    plan.add_repo(
+        gh_repo,
+        latest[0].number + 1 if latest else 1,
+        # Issues are listed in ascending id order.
+        [redmine_id for redmine_id in redmine_ids if ledger.get(redmine_id) is None],
+    )
+
+
+def planned_link(fetcher, ledger, plan, dependency, predicted):
+    entry = ledger.get(dependency)
+    if entry is not None:
+        return entry.html_url
+
+    url = plan.predicted_url(dependency)
+    if url is not None:
+        predicted.append(url)
+        return url
+
+    return dependency_link(fetcher, ledger, dependency)
+
+
+def complete_migration(
+    closer,
+    status_bar,
+    issue,
+    entry,
+    subtasks,
+    relations,
+    has_subtasks_or_relations,
+):
+    status_bar_width = len(status_bar) * " "
+    if has_subtasks_or_relations:
+        with _PENDING_ISSUES_LOCK:
+            _PENDING_ISSUES[issue.id] = _PendingIssue(
+                issue.id,
+                issue.status.id,
+                entry.repo,
+                entry.number,
+                entry.html_url,
+                subtasks,
+                relations,
+            )
+        print(
+            f"  {_YELLOW_CIRCLE_BULLET} {status_bar} Partially migrated Redmine issue #{issue.id}: {issue.subject}"
+        )
+        print(f"    {status_bar_width}  - {entry.html_url}")
+        print(
+            f"    {status_bar_width}  - Will not close Redmine issue #{issue.id} until issue dependencies are verified"
+        )
+    else:
+        symbol = _YELLOW_CIRCLE_BULLET
+        redmine_message = f"Could not close Redmine issue #{issue.id}"
+        if entry.redmine_closed:
+            symbol = _GREEN_CHECKMARK
+            redmine_message = f"Redmine issue #{issue.id} was already closed"
+        elif closer is not None:
+            # Closed, and verified, once all projects are migrated
+            closer.submit(issue.id, entry.html_url, issue.status.id)
+            symbol = _GREEN_CHECKMARK
+            redmine_message = f"Will close Redmine issue #{issue.id}"
+        else:
+            redmine_message = f"Not configured to close issue #{issue.id}"
+        print(
+            f"  {symbol} {status_bar} Migrated issue #{issue.id}: {issue.subject}"
+        )
+        print(f"    {status_bar_width}  - {entry.html_url}")
+        print(f"    {status_bar_width}  - {redmine_message}")
+
+
+class _ThreadOutput(io.TextIOBase):
+    """Stand-in for sys.stdout that lets each thread hold back its output
+    and print it in one piece."""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self):
+        buffer, self._local.buffer = self._local.buffer, None
+        with self._lock:
+            self.stdout.write(buffer.getvalue() + "\n")
+            self.stdout.flush()
+
+    def write(self, s):
+        buffer = getattr(self._local, "buffer", None)
+        return (self.stdout if buffer is None else buffer).write(s)
+
+    def flush(self):
+        self.stdout.flush()
+
+
+def finish_imports(importer, closer, ledger, plan):
+    for context, number, errors in importer.wait():
+        repo, gh_repo, issue, status_bar, n_comments, subtasks, relations, predicted = context
+        status_bar_width = len(status_bar) * " "
+
+        if number is None:
+            plan.skipped(issue.id)
+            print(
+                f"  {_RED_HEAVY_BALLOT_X} {status_bar} Could not import issue #{issue.id}: {issue.subject}"
+            )
+            for error in errors:
+                print(f"    {status_bar_width}  - {error}")
+            continue
+
+        plan.created(issue.id, number)
+        entry = ledger.record_issue(
+            issue.id,
+            gh_repo,
+            number,
+            f"{repo.html_url}/issues/{number}",
+            comments_posted=n_comments,
+        )
+
+        has_subtasks_or_relations = bool(subtasks or relations)
+        if has_subtasks_or_relations and not predicted:
+            ledger.record_dependencies(issue.id)
+            has_subtasks_or_relations = False
+
+        complete_migration(
+            closer,
+            status_bar,
+            issue,
+            entry,
+            subtasks,
+            relations,
+            has_subtasks_or_relations,
+        )
+
+
+def migrate_issues_from(
+    fetcher,
+    ledger,
+    plan,
+    importer,
+    attachments,
+    closer,
+    executor,
+    parsed_args,
+    redmine_repo,
+    gh_repo,
+    project,
+):
     repo = None if parsed_args.dry_run else _GH_ORG.get_repo(gh_repo)
-    repo_issues = None if parsed_args.dry_run else gh_issues(repo)
 
-    print(f"There are {len(redmine_issues)} issues in the {redmine_repo} repository")
+    n_issues, pages = fetcher.issue_pages(project)
+    print(f"There are {n_issues} issues in the {redmine_repo} repository")
 
-    # Ensures that we do not process nested repos to themselves.
-    trimmed_redmine_issues = [
-        issue for issue in redmine_issues if issue.project.name == project_name
-    ]
     n_migrated_issues = 0
-    n_issues = len(trimmed_redmine_issues)
     width = len(str(n_issues))
 
     if n_issues == 0:
@@ -150,64 +475,88 @@ def migrate_issues_from(redmine, parsed_args, redmine_repo, gh_repo):
         print(
             f"\nWould migrate {n_issues} {redmine_repo} issues from Redmine to GitHub"
         )
-    elif parsed_args.get_users:
-        print(f"\nGetting users for Redmine issues in {redmine_repo}")
     else:
         print(f"\nMigrating {n_issues} {redmine_repo} issues from Redmine to GitHub")
 
-    for i, issue in enumerate(reversed(trimmed_redmine_issues)):
-        author = at_gh_login_or_name(redmine, issue.author)
-        comments = issue_comments(redmine, issue.journals, gh_repo)
-
+    def summaries():
+        for page in pages:
+            # Look up the subjects of the related issues a page at a time.
+            fetcher.prefetch_issues(
+                relation.issue_to_id for issue in page for relation in issue.relations
+            )
+            yield from page
+
+    # Issues are fetched, then converted together with their users, in
+    # stages that run ahead of publishing; they are published in order.
+    fetched = Stage(fetcher.populate, workers=_FETCH_WORKERS)(summaries())
+    prepared = Stage(
+        lambda batch: prepare_issues(
+            fetcher, ledger, executor, attachments, repo, gh_repo, batch
+        ),
+        workers=_PREPARE_WORKERS,
+    )(batched(fetched, _PREPARE_BATCH))
+
+    for i, (issue, markdown, attachment_urls) in enumerate(flattened(prepared)):
         status_bar = f"[{i + 1:{width}d}/{n_issues}]"
         status_bar_width = len(status_bar) * " "
 
-        if parsed_args.get_users:
-            print(f"  {status_bar} Gathered users for issue #{issue.id}")
+        entry = None if repo is None else ledger.get(issue.id)
+        if entry is not None:
+            plan.skipped(issue.id)
+        has_subtasks_or_relations = (
+            len(issue.children) > 0 or len(issue.relations) > 0
+        ) and not (entry is not None and entry.dependencies_done)
+
+        if (
+            entry is not None
+            and entry.comments_posted >= n_comments(issue)
+            and not has_subtasks_or_relations
+            and (entry.redmine_closed or not parsed_args.close_redmine_issues)
+        ):
+            print(
+                f"  {_GREEN_CHECKMARK} {status_bar} Already migrated issue #{issue.id}: {issue.subject}"
+            )
+            print(f"    {status_bar_width}  - {entry.html_url}")
             continue
 
-        has_subtasks_or_relations = False
+        for name, url in attachment_urls.items():
+            if url is None:
+                print(f"    {status_bar_width}  - Could not publish attachment {name}")
 
-        if len(issue.children) > 0:
-            has_subtasks_or_relations = True
-            subtasks = []
+        author = at_gh_login_or_name(fetcher, issue.author)
+        comments = issue_comments(fetcher, issue.journals, markdown)
+
+        subtasks = []
+        relations = []
+
+        if has_subtasks_or_relations and len(issue.children) > 0:
             for subtask in issue.children:
-                subtasks.append(
-                    {
-                        "subject": subtask.subject,
-                        "redmine_url": redmine_issue_url(subtask),
-                    }
-                )
-            _ISSUES_WITH_SUBTASKS[issue.subject] = subtasks
+                subtasks.append(subtask.id)
 
-        if len(issue.relations) > 0:
-            has_subtasks_or_relations = True
-            relations = []
+        if has_subtasks_or_relations and len(issue.relations) > 0:
             for relation in issue.relations:
-                related_issue = redmine.issue.get(relation.issue_to_id)
-                relations.append(
-                    {
-                        "subject": related_issue.subject,
-                        "redmine_url": redmine_issue_url(related_issue),
-                    }
-                )
-            _ISSUES_WITH_RELATIONS[issue.subject] = relations
+                if fetcher.issue(relation.issue_to_id) is not None:
+                    relations.append(relation.issue_to_id)
 
         gh_issue_body = concat_mds(
-            f"*This issue has been migrated from {redmine_issue_url(issue)} (FNAL account required)*\n"
+            f"*This issue has been migrated from {redmine_issue_url(issue.id)} (FNAL account required)*\n"
             f"*Originally created by {author} on {issue.created_on}*",
-            _TEXTILE_TO_MARKDOWN.to_md(issue.description, gh_repo),
+            markdown[issue.description],
+            attachments_md(attachment_urls),
         )
 
         assigned_to = getattr(issue, "assigned_to", GithubObject.NotSet)
         if assigned_to is not GithubObject.NotSet:
-            assigned_to = gh_login_or_not_set(redmine, assigned_to)
-            if assigned_to not in _GH_ORG_MEMBERS:
+            assigned_to = gh_login_or_not_set(fetcher, assigned_to)
+            members = _GH_ORG.members()
+            if members is not None and assigned_to not in members:
+                if plan is not None:
+                    plan.skipped(issue.id)
                 print(
                     f"  {_RED_HEAVY_BALLOT_X} {status_bar} Could not migrate issue #{issue.id}: {issue.subject}"
                 )
                 print(
-                    f"    {status_bar_width}  - Assignee {assigned_to} is not a member of {_GH_ORG.login}."
+                    f"    {status_bar_width}  - Assignee {assigned_to} is not a member of {GITHUB_ORG}."
                 )
                 continue
 
@@ -235,7 +584,46 @@ def migrate_issues_from(redmine, parsed_args, redmine_repo, gh_repo):
         if issue.priority.name.lower() in {"high", "urgent", "immediate"}:
             gh_labels.append("high priority")
 
-        if issue.subject not in repo_issues.keys():
+        gh_issue = None
+        if entry is None:
+            # Links to issues that are not created yet use predicted numbers,
+            # which are verified once all repositories have been migrated.
+            predicted = []
+            dependencies = dependencies_md(
+                subtasks,
+                relations,
+                lambda d: planned_link(fetcher, ledger, plan, d, predicted),
+            )
+            gh_issue_body = concat_mds(gh_issue_body, dependencies)
+
+            if importer is not None:
+                submitted = importer.submit(
+                    repo,
+                    issue.id,
+                    issue.subject,
+                    gh_issue_body,
+                    gh_labels,
+                    None if assigned_to is GithubObject.NotSet else assigned_to,
+                    comments,
+                    (
+                        repo,
+                        gh_repo,
+                        issue,
+                        status_bar,
+                        len(comments),
+                        subtasks,
+                        relations,
+                        predicted,
+                    ),
+                )
+                if submitted:
+                    print(f"    {status_bar_width}  - Importing new issue from Redmine issue #{issue.id}")
+                else:
+                    print(f"    {status_bar_width}  - Polling earlier import of Redmine issue #{issue.id}")
+                if importer.full():
+                    finish_imports(importer, closer, ledger, plan)
+                continue
+
             print(f"    {status_bar_width}  - Creating new issue from Redmine issue #{issue.id}")
             gh_issue = guarded_gh_call(
                 repo.create_issue,
@@ -243,98 +631,134 @@ def migrate_issues_from(redmine, parsed_args, redmine_repo, gh_repo):
                 body=gh_issue_body,
                 labels=gh_labels,
                 assignee=assigned_to,
+                resource=SECONDARY,
             )
-
-            for comment in comments:
-                guarded_gh_call(gh_issue.create_comment, comment)
-        else:
-            print(f"    {status_bar_width}  - Retrieving Github issue {repo_issues[issue.subject]}")
-            gh_issue = guarded_gh_call(repo.get_issue, number=repo_issues[issue.subject])
-
-
-        _GH_ISSUES[issue.subject] = (issue, gh_issue)
-        if has_subtasks_or_relations:
-            print(
-                f"  {_YELLOW_CIRCLE_BULLET} {status_bar} Partially migrated Redmine issue #{issue.id}: {issue.subject}"
-            )
-            print(f"    {status_bar_width}  - {gh_issue.html_url}")
-            print(
-                f"    {status_bar_width}  - Will not close Redmine issue #{issue.id} until issue dependencies are resolved"
-            )
-        else:
-            symbol = _YELLOW_CIRCLE_BULLET
-            redmine_message = f"Could not close Redmine issue #{issue.id}"
-            if parsed_args.close_redmine_issues:
-                # Update Redmine issue with new GitHub issue ID; then close issue (status ID 5).
-                redmine.issue.update(
-                    issue.id,
-                    notes=f"This issue has moved to {gh_issue.html_url}",
-                    status_id=5,
-                )
-                if redmine.issue.get(issue.id).status.id == 5:
-                    # Redmine issue was closed
-                    symbol = _GREEN_CHECKMARK
-                    redmine_message = f"Closed Redmine issue #{issue.id}"
-            else:
-                redmine_message = f"Not configured to close issue #{issue.id}"
-            print(
-                f"  {symbol} {status_bar} Migrated issue #{issue.id}: {issue.subject}"
+            plan.created(issue.id, gh_issue.number)
+            entry = ledger.record_issue(
+                issue.id, gh_repo, gh_issue.number, gh_issue.html_url
             )
-            print(f"    {status_bar_width}  - {gh_issue.html_url}")
-            print(f"    {status_bar_width}  - {redmine_message}")
+            if has_subtasks_or_relations and not predicted:
+                ledger.record_dependencies(issue.id)
+                has_subtasks_or_relations = False
+        elif entry.comments_posted < len(comments):
+            print(f"    {status_bar_width}  - Retrieving Github issue {entry.number}")
+            gh_issue = guarded_gh_call(repo.get_issue, number=entry.number)
+
+        for n, comment in enumerate(
+            comments[entry.comments_posted :], start=entry.comments_posted + 1
+        ):
+            guarded_gh_call(gh_issue.create_comment, comment, resource=SECONDARY)
+            ledger.record_comments(issue.id, n)
+
+        complete_migration(
+            closer,
+            status_bar,
+            issue,
+            entry,
+            subtasks,
+            relations,
+            has_subtasks_or_relations,
+        )
+
+    if importer is not None:
+        finish_imports(importer, closer, ledger, plan)
 
     return n_migrated_issues, n_issues
 
 
-def dependency_link(dependency):
-    # Check organization first
-    time.sleep(2.5)  # Avoid GitHub rate limits
-    issues = _GH.search_issues(
-        f"{dependency['subject']} in:title is:issue is:open org:{GITHUB_ORG}"
-    )
-    if issues.totalCount == 1:
-        return issues[0].html_url
+def dependency_link(fetcher, ledger, dependency):
+    # Every issue migrated with this script is recorded in the ledger.
+    entry = ledger.get(dependency)
+    if entry is not None:
+        return entry.html_url
 
-    time.sleep(2.5)  # Avoid GitHub rate limits
-    issues = _GH.search_issues(f"{dependency['subject']} in:title is:issue is:open")
-    if issues.totalCount == 1:
-        return issues[0].html_url
+    # Otherwise search by title, checking the organization first
+    issue = fetcher.issue(dependency)
+    if issue is not None:
+        issues = search_gh_issues(
+            f"{issue.subject} in:title is:issue is:open org:{GITHUB_ORG}"
+        )
+        if len(issues) == 1:
+            return issues[0].html_url
 
-    return dependency["redmine_url"] + " (FNAL account required)"
+        issues = search_gh_issues(f"{issue.subject} in:title is:issue is:open")
+        if len(issues) == 1:
+            return issues[0].html_url
+
+    return redmine_issue_url(dependency) + " (FNAL account required)"
 
 
 def update_gh_issue_body(
-    close_redmine_issues, status_bar, redmine, redmine_issue, gh_issue, body_addendum
+    closer,
+    status_bar,
+    ledger,
+    pending,
+    dependencies,
 ):
-    guarded_gh_call(gh_issue.edit, body=concat_mds(gh_issue.body, body_addendum))
-    if close_redmine_issues:
-        # Update Redmine issue with new GitHub issue ID; then close issue (status ID 5).
-        redmine.issue.update(
-            redmine_issue.id,
-            notes=f"This issue has moved to {gh_issue.html_url}",
-            status_id=5,
-        )
+    gh_issue = guarded_gh_call(_GH_ORG.get_repo(pending.gh_repo).get_issue, pending.number)
+    body = with_dependencies(gh_issue.body or "", dependencies)
+    if body != gh_issue.body:
+        guarded_gh_call(gh_issue.edit, body=body, resource=SECONDARY)
+    ledger.record_dependencies(pending.redmine_id)
     status_bar_width = len(status_bar) * " "
-    if redmine.issue.get(redmine_issue.id).status.id != 5:
+    if closer is None:
         print(
-            f"  {_YELLOW_CIRCLE_BULLET} {status_bar} Could not complete migration for Redmine issue #{redmine_issue.id}"
+            f"  {_YELLOW_CIRCLE_BULLET} {status_bar} Completed migration of Redmine issue #{pending.redmine_id}"
         )
         print(
-            f"    {status_bar_width}  - Updated issue dependencies for {gh_issue.html_url}"
+            f"    {status_bar_width}  - Verified issue dependencies for {pending.html_url}"
         )
         print(
-            f"    {status_bar_width}  - Could not close Redmine issue #{redmine_issue.id}"
+            f"    {status_bar_width}  - Not configured to close issue #{pending.redmine_id}"
         )
         return
 
-    # Redmine issue was closed
+    closer.submit(pending.redmine_id, pending.html_url, pending.status_id)
     print(
-        f"  {_GREEN_CHECKMARK} {status_bar} Completed migration of Redmine issue #{redmine_issue.id}: {redmine_issue.subject}"
+        f"  {_GREEN_CHECKMARK} {status_bar} Completed migration of Redmine issue #{pending.redmine_id}"
     )
     print(
-        f"    {status_bar_width}  - Updated issue dependencies for {gh_issue.html_url}"
+        f"    {status_bar_width}  - Verified issue dependencies for {pending.html_url}"
     )
-    print(f"    {status_bar_width}  - Closed Redmine issue #{redmine_issue.id}")
+    print(f"    {status_bar_width}  - Will close Redmine issue #{pending.redmine_id}")
+
+
+def verify_dependencies(fetcher, ledger, closer):
+    print("Verifying issues with subtasks and related issues")
+
+    # Subjects are only needed for dependencies that were not migrated.
+    fetcher.prefetch_issues(
+        dependency
+        for pending in _PENDING_ISSUES.values()
+        for dependency in pending.subtasks + pending.relations
+        if ledger.get(dependency) is None
+    )
+
+    n_issues_with_dependencies = len(_PENDING_ISSUES)
+    width = len(str(n_issues_with_dependencies))
+    print(f"\n  Verifying {n_issues_with_dependencies} issues")
+
+    for i, pending in enumerate(_PENDING_ISSUES.values()):
+        status_bar = f"[{i + 1:{width}d}/{n_issues_with_dependencies}]"
+        dependencies = dependencies_md(
+            pending.subtasks,
+            pending.relations,
+            lambda d: dependency_link(fetcher, ledger, d),
+        )
+        update_gh_issue_body(closer, status_bar, ledger, pending, dependencies)
+
+    print()
+
+
+def close_redmine_issues(closer):
+    print("Closing migrated Redmine issues")
+    closed, failures = closer.finish()
+    print(f"\n  Closed {len(closed)} Redmine issues")
+    for issue_id, reason in sorted(failures.items()):
+        print(
+            f"  {_RED_HEAVY_BALLOT_X} Could not close Redmine issue #{issue_id}: {reason}"
+        )
+    print()
 
 
 def migrate(parsed_args):
@@ -344,70 +768,129 @@ def migrate(parsed_args):
         key=settings.REDMINE_API_PUBLIC_KEY,
     )
 
-    for repo, gh_repo in zip(FNAL_REDMINE_REPOS, GITHUB_ORG_REPOS):
-        migrate_issues_from(redmine, parsed_args, repo, gh_repo)
+    fetcher = (
+        RedmineFetcher(redmine)
+        if parsed_args.snapshot is None
+        else SnapshotFetcher(redmine, RedmineSnapshot(parsed_args.snapshot))
+    )
 
-    print()
+    ledger = MigrationLedger(parsed_args.ledger)
+    _CONVERSION_CACHE.directory = parsed_args.conversion_cache
+    _GH_ORG.members_path = parsed_args.org_members
+    _GH_ORG.offline = parsed_args.dry_run
+
+    # Plan the issue numbers of the whole migration first, so that most
+    # issues can be created with their final dependency links.
+    plan = None if parsed_args.dry_run or parsed_args.get_users else MigrationPlan(GITHUB_ORG)
+    projects = []
+    users = {}  # Redmine user id -> user
+    for repo, gh_repo in zip(FNAL_REDMINE_REPOS, GITHUB_ORG_REPOS):
+        # Only the issues of the project itself are listed, not those of
+        # its subprojects.  Each issue is later fetched together with its
+        # journals and children, so that the migration does not trigger
+        # lazy Redmine requests.  Planning only keeps the ids of the issues
+        # and their users; the migration lists them again, a page at a time.
+        project = fetcher.project(repo)
+        if plan is not None:
+            adopt_gh_issues(fetcher, ledger, gh_repo)
+            redmine_ids = []
+            for issue in fetcher.issue_summaries(project):
+                redmine_ids.append(issue.id)
+                mentioned_users(users, issue, with_comments=False)
+            plan_issue_numbers(plan, ledger, gh_repo, redmine_ids)
+        projects.append((repo, gh_repo, project))
+
+    if users:
+        n_users = resolve_users(fetcher, users)
+        _USER_CACHE.save()
+        print(f"Resolved {n_users} authors and assignees of issues\n")
 
     if parsed_args.get_users:
+        for issue in Stage(fetcher.populate, workers=_FETCH_WORKERS)(
+            issue
+            for *_, project in projects
+            for issue in flattened(fetcher.issue_pages(project)[1])
+        ):
+            mentioned_users(users, issue)
+        n_users = resolve_users(fetcher, users)
+        _USER_CACHE.save()
+        print(f"Resolved {n_users} Redmine users\n")
         print(_REDMINE_TO_GITHUB.table())
         return
 
-    if not _ISSUES_WITH_SUBTASKS and not _ISSUES_WITH_RELATIONS:
-        return
-
-    print("Updating issues with subtasks and related issues")
-
-    # Pre-populate dictionary
-    issue_dependencies = {}
-    for issue in _ISSUES_WITH_SUBTASKS.keys():
-        issue_dependencies.setdefault(issue, "")
-    for issue in _ISSUES_WITH_RELATIONS.keys():
-        issue_dependencies.setdefault(issue, "")
-
-    n_issues_with_subtasks = len(_ISSUES_WITH_SUBTASKS)
-    if n_issues_with_subtasks != 0:
-        print(f"  Locating subtasks for {n_issues_with_subtasks} issues")
-    for key, subtasks in _ISSUES_WITH_SUBTASKS.items():
-        subtasks_str = "\n***Subtasks:***"
-        for d in subtasks:
-            subtasks_str += "\n- " + guarded_gh_call(dependency_link, d)
-        issue_dependencies[key] += subtasks_str
-
-    n_issues_with_relations = len(_ISSUES_WITH_RELATIONS)
-    if n_issues_with_relations != 0:
-        print(f"  Locating related issues for {n_issues_with_relations} issues")
-    for key, subtasks in _ISSUES_WITH_RELATIONS.items():
-        subtasks_str = "\n***Related issues:***"
-        for d in subtasks:
-            subtasks_str += "\n- " + guarded_gh_call(dependency_link, d)
-        issue_dependencies[key] += subtasks_str
-
-    n_issues_with_dependencies = len(issue_dependencies)
-    width = len(str(n_issues_with_dependencies))
-    print(f"\n  Updating {n_issues_with_dependencies} issues")
+    def migrate_project(executor, repo, gh_repo, project):
+        migrate_issues_from(
+            fetcher,
+            ledger,
+            plan,
+            IssueImporter(_RATE_LIMITER, ledger) if parsed_args.import_issues else None,
+            attachments,
+            closer,
+            executor,
+            parsed_args,
+            repo,
+            gh_repo,
+            project,
+        )
 
-    for i, (key, body_str) in enumerate(issue_dependencies.items()):
-        status_bar = f"[{i + 1:{width}d}/{n_issues_with_dependencies}]"
-        entry = _GH_ISSUES.get(key)
-        if entry is not None:
-            redmine_issue, gh_issue = entry
-            update_gh_issue_body(
-                parsed_args.close_redmine_issues,
-                status_bar,
-                redmine,
-                redmine_issue,
-                gh_issue,
-                body_str,
-            )
-            continue
+    # Dry runs neither update Redmine nor contact GitHub.
+    closer = (
+        RedmineCloser(redmine, ledger)
+        if parsed_args.close_redmine_issues and not parsed_args.dry_run
+        else None
+    )
+    # Attachments are published to GitHub, which dry runs do not contact.
+    attachments = (
+        AttachmentMigrator(redmine, ledger, _RATE_LIMITER)
+        if parsed_args.migrate_attachments and not parsed_args.dry_run
+        else None
+    )
 
-        print(
-            f"  {_RED_HEAVY_BALLOT_X} {status_bar} Cannot find GitHub issue with title '{key}'"
-        )
+    # Worker processes are spawned rather than forked from this process,
+    # whose other threads may hold locks.  None is started until a batch
+    # has enough text to be converted in parallel.
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as executor:
+        if parsed_args.jobs == 1:
+            for project in projects:
+                migrate_project(executor, *project)
+                _USER_CACHE.save()
+        else:
+            # Each repository's output is printed once the repository is done.
+            output = _ThreadOutput(sys.stdout)
+
+            def migrate_captured(project):
+                output.capture()
+                try:
+                    migrate_project(executor, *project)
+                finally:
+                    output.release()
+
+            sys.stdout = output
+            try:
+                with ThreadPoolExecutor(max_workers=parsed_args.jobs) as workers:
+                    futures = [workers.submit(migrate_captured, p) for p in projects]
+                    for future in as_completed(futures):
+                        future.result()
+            finally:
+                sys.stdout = output.stdout
+            _USER_CACHE.save()
+
+    if attachments is not None:
+        attachments.close()
 
+    print(
+        f"\nConverted {_CONVERSION_CACHE.misses} Textile texts"
+        f" ({_CONVERSION_CACHE.hits} more were cached)"
+    )
     print()
 
+    if _PENDING_ISSUES:
+        verify_dependencies(fetcher, ledger, closer)
+
+    # Redmine issues are only closed once their GitHub issues are complete.
+    if closer is not None:
+        close_redmine_issues(closer)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -434,6 +917,41 @@ if __name__ == "__main__":
         action="store_true",
         help="Show what information would be published to GitHub.",
     )
+    parser.add_argument(
+        "--snapshot",
+        help="Read Redmine data from a snapshot made with snapshot-redmine.py.",
+    )
+    parser.add_argument(
+        "--import-issues",
+        action="store_true",
+        help="Create each issue with all its comments through GitHub's issue import API.",
+    )
+    parser.add_argument(
+        "--migrate-attachments",
+        action="store_true",
+        help="Publish the attachments of issues as assets of a release of each repository.",
+    )
+    parser.add_argument(
+        "--conversion-cache",
+        help="Directory in which to keep Textile-to-Markdown conversions across runs.",
+    )
+    parser.add_argument(
+        "--org-members",
+        help="File in which to keep the member list of the GitHub organization for a day;"
+        " dry runs check assignees against it.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of repositories to migrate concurrently (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--ledger",
+        default="migration-ledger.sqlite",
+        help="File recording the progress of the migration (default: %(default)s).",
+    )
 
     args = parser.parse_args()
     migrate(args)
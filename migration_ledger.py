@@ -0,0 +1,175 @@
+from collections import namedtuple
+
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    redmine_id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    html_url TEXT NOT NULL,
+    comments_posted INTEGER NOT NULL DEFAULT 0,
+    dependencies_done INTEGER NOT NULL DEFAULT 0,
+    redmine_closed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS issues_repo ON issues (repo);
+CREATE TABLE IF NOT EXISTS attachments (
+    redmine_id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assets (
+    sha256 TEXT PRIMARY KEY,
+    url TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS redmine_notes (
+    redmine_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS imports (
+    redmine_id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    import_id INTEGER NOT NULL,
+    submitted_on TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issue_cursors (
+    repo TEXT PRIMARY KEY,
+    cursor TEXT NOT NULL
+);
+"""
+
+LedgerEntry = namedtuple(
+    "LedgerEntry",
+    [
+        "redmine_id",
+        "repo",
+        "number",
+        "html_url",
+        "comments_posted",
+        "dependencies_done",
+        "redmine_closed",
+    ],
+)
+
+
+class MigrationLedger:
+    """On-disk record of the migration progress of each Redmine issue.
+
+    Every step is committed as soon as it has been performed on GitHub or
+    Redmine, so that an interrupted migration resumes exactly where it
+    stopped, down to the next comment to post.  The ledger may be shared
+    by the threads that migrate different repositories.
+
+    Imports submitted to the issue import API are recorded until they are
+    known to have failed, so that an interrupted run does not import the
+    same issues again.
+
+    The ledger also records the digest of each Redmine attachment that was
+    downloaded, and where contents with that digest were published, as
+    well as how far the issues of each GitHub repository were listed.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+
+    def close(self):
+        self._db.close()
+
+    def get(self, redmine_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM issues WHERE redmine_id = ?", (redmine_id,)
+            ).fetchone()
+        return None if row is None else LedgerEntry(*row)
+
+    def _update(self, redmine_id, **values):
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE issues SET {assignments} WHERE redmine_id = ?",
+                (*values.values(), redmine_id),
+            )
+            self._db.commit()
+
+    def record_issue(self, redmine_id, repo, number, html_url, comments_posted=0):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO issues (redmine_id, repo, number, html_url, comments_posted)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (redmine_id, repo, number, html_url, comments_posted),
+            )
+            self._db.commit()
+            return self.get(redmine_id)
+
+    def record_comments(self, redmine_id, comments_posted):
+        self._update(redmine_id, comments_posted=comments_posted)
+
+    def record_dependencies(self, redmine_id):
+        self._update(redmine_id, dependencies_done=1)
+
+    def record_closed(self, redmine_id):
+        self._update(redmine_id, redmine_closed=1)
+
+    def redmine_noted(self, redmine_id):
+        """Returns whether the Redmine issue was pointed at its GitHub issue,
+        whether or not it was closed as well."""
+        return (
+            self._lookup("SELECT 1 FROM redmine_notes WHERE redmine_id = ?", redmine_id)
+            is not None
+        )
+
+    def record_redmine_note(self, redmine_id):
+        self._insert("REPLACE INTO redmine_notes VALUES (?)", (redmine_id,))
+
+    def submitted_import(self, redmine_id):
+        """Returns the (repository URL, import id, submission date) of the
+        import of a Redmine issue that was submitted, or None."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT repo, import_id, submitted_on FROM imports WHERE redmine_id = ?",
+                (redmine_id,),
+            ).fetchone()
+
+    def record_import(self, redmine_id, repo, import_id, submitted_on):
+        self._insert(
+            "REPLACE INTO imports VALUES (?, ?, ?, ?)",
+            (redmine_id, repo, import_id, submitted_on),
+        )
+
+    def forget_import(self, redmine_id):
+        self._insert("DELETE FROM imports WHERE redmine_id = ?", (redmine_id,))
+
+    def _lookup(self, sql, key):
+        with self._lock:
+            row = self._db.execute(sql, (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _insert(self, sql, values):
+        with self._lock:
+            self._db.execute(sql, values)
+            self._db.commit()
+
+    def attachment_sha256(self, redmine_id):
+        """Returns the SHA-256 digest of the contents of a Redmine attachment
+        that was downloaded before, or None."""
+        return self._lookup("SELECT sha256 FROM attachments WHERE redmine_id = ?", redmine_id)
+
+    def record_attachment(self, redmine_id, sha256):
+        self._insert("REPLACE INTO attachments VALUES (?, ?)", (redmine_id, sha256))
+
+    def asset_url(self, sha256):
+        """Returns the URL at which contents with this digest were published,
+        or None."""
+        return self._lookup("SELECT url FROM assets WHERE sha256 = ?", sha256)
+
+    def record_asset(self, sha256, url):
+        self._insert("REPLACE INTO assets VALUES (?, ?)", (sha256, url))
+
+    def issue_cursor(self, repo):
+        """Returns the GraphQL cursor after the last listed issue of a GitHub
+        repository, or None if its issues were never listed."""
+        return self._lookup("SELECT cursor FROM issue_cursors WHERE repo = ?", repo)
+
+    def record_issue_cursor(self, repo, cursor):
+        self._insert("REPLACE INTO issue_cursors VALUES (?, ?)", (repo, cursor))
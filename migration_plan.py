@@ -0,0 +1,49 @@
+import threading
+
+
+class MigrationPlan:
+    """Predicted GitHub issue numbers for the issues a run will create.
+
+    Issues are created in a known order, and GitHub numbers the issues of a
+    repository consecutively, so the number of a planned issue can be
+    predicted from the next free number of its repository.  Predictions are
+    corrected as the run proceeds: each issue that is created or skipped
+    moves the repository's queue forward.  Links that were written with a
+    prediction still need to be verified once the run is over.
+    """
+
+    def __init__(self, github_org):
+        self._gh_org = github_org
+        self._lock = threading.Lock()
+        self._repos = {}  # GitHub repo -> [next number, position of next issue]
+        self._positions = {}  # Redmine issue id -> (GitHub repo, position)
+
+    def add_repo(self, gh_repo, next_number, redmine_ids):
+        with self._lock:
+            self._repos[gh_repo] = [next_number, 0]
+            for position, redmine_id in enumerate(redmine_ids):
+                self._positions[redmine_id] = (gh_repo, position)
+
+    def predicted_url(self, redmine_id):
+        with self._lock:
+            planned = self._positions.get(redmine_id)
+            if planned is None:
+                return None
+            gh_repo, position = planned
+            next_number, head = self._repos[gh_repo]
+        number = next_number + position - head
+        return f"https://github.com/{self._gh_org}/{gh_repo}/issues/{number}"
+
+    def created(self, redmine_id, number):
+        with self._lock:
+            planned = self._positions.pop(redmine_id, None)
+            if planned is not None:
+                gh_repo, position = planned
+                self._repos[gh_repo] = [number + 1, position + 1]
+
+    def skipped(self, redmine_id):
+        with self._lock:
+            planned = self._positions.pop(redmine_id, None)
+            if planned is not None:
+                gh_repo, position = planned
+                self._repos[gh_repo][1] = position + 1
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import collections
+import itertools
+
+
+class Stage:
+    """One stage of a pipeline, applying a function to each item on a pool
+    of threads.
+
+    A stage is called with an iterable of items and yields the results in
+    the order of the items.  At most `capacity` items are in flight at any
+    time: a stage that runs ahead of its consumer stops taking items until
+    the consumer catches up, which in turn holds back the stages before it.
+    """
+
+    def __init__(self, function, workers=1, capacity=None):
+        self._function = function
+        self._workers = workers
+        self._capacity = capacity if capacity is not None else 2 * workers
+
+    def __call__(self, items):
+        items = iter(items)
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            try:
+                for item in itertools.islice(items, self._capacity):
+                    pending.append(executor.submit(self._function, item))
+                while pending:
+                    result = pending.popleft().result()
+                    for item in itertools.islice(items, 1):
+                        pending.append(executor.submit(self._function, item))
+                    yield result
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+def batched(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def flattened(batches):
+    for batch in batches:
+        yield from batch
@@ -0,0 +1,98 @@
+#!/bin/env python3
+
+from termcolor import colored
+
+from textile_to_markdown import TextileToMarkdown
+from wiki_publisher import WikiPublisher
+from repositories_to_migrate import FNAL_REDMINE_REPOS, GITHUB_ORG
+
+import argparse
+import os
+import subprocess
+import sys
+
+_TEXTILE_TO_MARKDOWN = TextileToMarkdown(GITHUB_ORG)
+
+_GREEN_CHECKMARK = colored("\u2714", "green")
+_RED_HEAVY_BALLOT_X = colored("\u2718", "red")
+
+
+def publish_wiki_of(publisher, parsed_args, redmine_repo):
+    project_directory = f"./redmine/{redmine_repo}"
+    gh_repo = redmine_repo.replace("_", "-")
+
+    if parsed_args.dry_run:
+        clone = os.path.join(parsed_args.clones, f"{gh_repo}.wiki")
+        changed, removed, _, _ = publisher.changes(project_directory, clone)
+        print(
+            f"  Would write {len(changed)} and remove {len(removed)} files of the {gh_repo} wiki"
+        )
+        return True
+
+    try:
+        result = publisher.publish(
+            project_directory, gh_repo, f"Migrate {redmine_repo} wiki from Redmine"
+        )
+    except subprocess.CalledProcessError as e:
+        # E.g. the wiki has no page yet, so GitHub has no repository for it.
+        print(f"  {_RED_HEAVY_BALLOT_X} Could not publish the {gh_repo} wiki")
+        print(f"    - {(e.stderr or '').strip()}")
+        return False
+    if result is None:
+        print(f"  {_GREEN_CHECKMARK} The {gh_repo} wiki is up to date")
+        return True
+    n_written, n_removed = result
+    print(
+        f"  {_GREEN_CHECKMARK} Published the {gh_repo} wiki ({n_written} files written, {n_removed} removed)"
+    )
+    return True
+
+
+def publish(parsed_args):
+    publisher = WikiPublisher(
+        _TEXTILE_TO_MARKDOWN, GITHUB_ORG, parsed_args.clones, parsed_args.remote
+    )
+    n_failed = 0
+    for repo in parsed_args.repos or FNAL_REDMINE_REPOS:
+        if os.path.isdir(f"./redmine/{repo}"):
+            if not publish_wiki_of(publisher, parsed_args, repo):
+                n_failed += 1
+
+    print()
+    return n_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Publish wiki pages saved by download-wikis.py to the GitHub wikis."
+    )
+    parser.add_argument(
+        "repos",
+        nargs="*",
+        help="Redmine projects to publish (default: all projects to migrate).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        "-n",
+        action="store_true",
+        help="Show which files would be written without committing or pushing.",
+    )
+    parser.add_argument(
+        "--clones",
+        default="./wikis",
+        help="Directory of the local clones of the wiki repositories (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--remote",
+        default=f"git@github.com:{GITHUB_ORG}/{{}}.wiki.git",
+        help="URL of the wiki repositories, {} standing for the repository name"
+        " (default: %(default)s).",
+    )
+
+    args = parser.parse_args()
+    n_failed = publish(args)
+
+    if n_failed:
+        print(f"Could not publish {n_failed} of the wikis.")
+        sys.exit(1)
+    print("Publishing was successful.")
@@ -0,0 +1,154 @@
+from github import GithubException
+
+import threading
+import time
+
+CORE = "core"
+SEARCH = "search"
+GRAPHQL = "graphql"
+SECONDARY = "secondary"
+
+
+class _Budget:
+    def __init__(self, reserve, window=None, window_limit=None, min_interval=0.0):
+        # Values reported by GitHub (core, search and GraphQL budgets)
+        self.remaining = None
+        self.reset = 0.0
+        self.reserve = reserve
+
+        # Locally tracked limits (GitHub does not report secondary limits)
+        self.window = window
+        self.window_limit = window_limit
+        self.min_interval = min_interval
+        self.calls = []
+
+
+class RateLimiter:
+    """Shared scheduler for GitHub API calls.
+
+    Core, search and GraphQL budgets are read from the X-RateLimit-*
+    headers of the most recent response.  Secondary (content-creation)
+    limits are not reported by GitHub, so they are tracked locally following
+    GitHub's guidance of at most 80 content-creating requests per minute,
+    spaced at least one second apart.  A call only waits when its budget is
+    (nearly) exhausted, and then only until the budget resets.
+
+    PyGithub is not thread-safe: every object of a Github client shares its
+    requester, whose connection holds the request being sent, and whose
+    rate-limit values are those of the latest response.  Calls are
+    therefore made one at a time, so that threads only overlap the work
+    they do between calls.  All calls on a client must go through its
+    rate limiter.
+    """
+
+    def __init__(self, gh, clock=time.time, sleep=time.sleep):
+        self._gh = gh
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Held while a call is made; calls may be nested.
+        self._call_lock = threading.RLock()
+        self._budgets = {
+            CORE: _Budget(reserve=10),
+            SEARCH: _Budget(reserve=1),
+            GRAPHQL: _Budget(reserve=10),
+            SECONDARY: _Budget(reserve=0, window=60.0, window_limit=80, min_interval=1.0),
+        }
+
+    def _resources(self, resource):
+        # Content-creating requests also count against the core budget.
+        return (CORE, SECONDARY) if resource == SECONDARY else (resource,)
+
+    def _delay(self, budget, now):
+        delay = 0.0
+        if (
+            budget.remaining is not None
+            and budget.remaining <= budget.reserve
+            and budget.reset > now
+        ):
+            delay = budget.reset - now
+        if budget.window is not None:
+            budget.calls = [t for t in budget.calls if t > now - budget.window]
+            if len(budget.calls) >= budget.window_limit:
+                delay = max(delay, budget.calls[0] + budget.window - now)
+        if budget.calls and budget.min_interval:
+            delay = max(delay, budget.calls[-1] + budget.min_interval - now)
+        return delay
+
+    def acquire(self, resource=CORE):
+        while True:
+            with self._lock:
+                now = self._clock()
+                delay = max(
+                    self._delay(self._budgets[r], now) for r in self._resources(resource)
+                )
+                if delay <= 0:
+                    for r in self._resources(resource):
+                        budget = self._budgets[r]
+                        if budget.window is not None or budget.min_interval:
+                            budget.calls.append(now)
+                        if budget.remaining is not None:
+                            budget.remaining -= 1
+                    return
+            self._wait(delay)
+
+    def update(self, resource=CORE):
+        # PyGithub records the rate-limit headers of the most recent response.
+        remaining, _ = self._gh.rate_limiting
+        reset = self._gh.rate_limiting_resettime
+        budget = self._budgets[CORE if resource == SECONDARY else resource]
+        with self._lock:
+            budget.remaining = remaining
+            budget.reset = float(reset)
+
+    def backoff(self, resource, exception, attempt):
+        """Return the number of seconds to wait before retrying, or None if the
+        exception is not caused by a rate limit."""
+        if exception.status not in (403, 429):
+            return None
+
+        headers = {k.lower(): v for k, v in (exception.headers or {}).items()}
+        data = exception.data if isinstance(exception.data, dict) else {}
+        message = data.get("message", "")
+        now = self._clock()
+
+        if "retry-after" in headers:
+            delay = float(headers["retry-after"])
+        elif headers.get("x-ratelimit-remaining") == "0":
+            delay = max(float(headers.get("x-ratelimit-reset", now)) - now, 0.0) + 1.0
+        elif message.startswith("You have exceeded a secondary rate limit"):
+            delay = 60.0 * 2 ** attempt
+        elif message.startswith("API rate limit exceeded"):
+            delay = max(self._budgets[CORE].reset - now, 60.0)
+        else:
+            return None
+
+        # Make every other caller of this budget wait as well.
+        budget = self._budgets[resource]
+        with self._lock:
+            budget.remaining = 0
+            budget.reset = max(budget.reset, now + delay)
+        return delay
+
+    def call(self, resource, method, *args, **kwargs):
+        attempt = 0
+        n = 4
+        while True:
+            self.acquire(resource)
+            try:
+                with self._call_lock:
+                    result = method(*args, **kwargs)
+                    self.update(resource)
+            except GithubException as e:
+                attempt += 1
+                delay = self.backoff(resource, e, attempt)
+                if attempt == n or delay is None:
+                    raise e
+                self._wait(delay)
+                continue
+            return result
+
+    def _wait(self, delay):
+        if delay >= 60:
+            print(f" \n   Waiting {delay / 60:.1f} minutes due to rate limit...\n")
+        self._sleep(delay)
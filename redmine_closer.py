@@ -0,0 +1,106 @@
+from redminelib.exceptions import BaseRedmineError
+from requests import RequestException
+
+from concurrent.futures import ThreadPoolExecutor
+
+_CLOSED = 5  # Redmine status id
+_BATCH_SIZE = 100  # Largest page Redmine serves per request
+
+
+class RedmineCloser:
+    """Closes migrated Redmine issues, pointing them at their GitHub issues.
+
+    Issues are queued as they are migrated and updated on a pool of
+    threads.  Once everything is migrated, their statuses are verified
+    with one request per batch of issues, and the issues that did not end
+    up closed are updated again.  Failures are reported at the end rather
+    than along with the migration progress.
+
+    The ledger records that the note was posted as soon as an update
+    succeeds, so that neither a retry nor a later run posts it twice.  An
+    issue that is closed already only gets its status verified.
+    """
+
+    def __init__(self, redmine, ledger, workers=4, attempts=3):
+        self._redmine = redmine
+        self._ledger = ledger
+        self._attempts = attempts
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._queued = {}  # Redmine issue id -> GitHub URL
+        self._updates = {}  # Redmine issue id -> future of the update
+
+    def submit(self, issue_id, html_url, status_id=None):
+        """Queues the closing of an issue; status_id is its current status,
+        if known."""
+        self._queued[issue_id] = html_url
+        if status_id == _CLOSED:
+            self._updates[issue_id] = None
+        else:
+            self._updates[issue_id] = self._executor.submit(self._update, issue_id)
+
+    def _update(self, issue_id):
+        if self._ledger.redmine_noted(issue_id):
+            # Only the status is retried; the note is already there.
+            self._redmine.issue.update(issue_id, status_id=_CLOSED)
+            return
+        self._redmine.issue.update(
+            issue_id,
+            notes=f"This issue has moved to {self._queued[issue_id]}",
+            status_id=_CLOSED,
+        )
+        self._ledger.record_redmine_note(issue_id)
+
+    def _statuses(self, issue_ids):
+        statuses = {}
+        for start in range(0, len(issue_ids), _BATCH_SIZE):
+            batch = issue_ids[start : start + _BATCH_SIZE]
+            for issue in self._redmine.issue.filter(
+                issue_id=",".join(map(str, batch)), status_id="*", limit=_BATCH_SIZE
+            ):
+                statuses[issue.id] = issue.status.id
+        return statuses
+
+    def finish(self):
+        """Waits for the queued updates, verifies them and retries those that
+        failed.  Returns the ids of the closed issues and {issue id: reason}
+        for those that could not be closed."""
+        closed = []
+        failures = {}
+        for attempt in range(1, self._attempts + 1):
+            errors = {}
+            for issue_id, update in self._updates.items():
+                try:
+                    if update is not None:
+                        update.result()
+                except (BaseRedmineError, RequestException) as e:
+                    errors[issue_id] = f"Update failed: {e!r}"
+
+            # An update that failed may still have been applied, e.g. if
+            # the request timed out, so every issue is verified.
+            verified = sorted(self._updates)
+            try:
+                statuses = self._statuses(verified)
+            except (BaseRedmineError, RequestException) as e:
+                statuses = {}
+                errors.update((i, f"Verification failed: {e!r}") for i in verified)
+            failures = {}
+            for issue_id in verified:
+                if statuses.get(issue_id) == _CLOSED:
+                    self._ledger.record_closed(issue_id)
+                    closed.append(issue_id)
+                elif issue_id in errors:
+                    failures[issue_id] = errors[issue_id]
+                elif issue_id not in statuses:
+                    failures[issue_id] = "Not found"
+                else:
+                    failures[issue_id] = f"Status is {statuses[issue_id]}, not closed"
+
+            self._updates = {}
+            if attempt < self._attempts:
+                for issue_id in failures:
+                    self._updates[issue_id] = self._executor.submit(self._update, issue_id)
+            if not self._updates:
+                break
+
+        self._executor.shutdown()
+        return closed, failures
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+
+import itertools
+import threading
+
+_PAGE_SIZE = 100  # Largest page Redmine serves per request
+
+_NOT_CACHED = object()
+
+# Redmine omits some included collections (e.g. children) when they are
+# empty.  Accessing a missing collection on a redminelib resource lazily
+# issues another request, so make sure they are always present.
+_INCLUDED_COLLECTIONS = ("journals", "children", "relations", "attachments")
+
+
+def stream(redmine, url, chunk_size):
+    """Yields the file at a Redmine URL in chunks of chunk_size bytes."""
+    # Redmine.download() swaps the engine of the client for the duration
+    # of the request, which is not safe to do from several threads.
+    with redmine.engine.session.get(url, stream=True) as response:
+        response.raise_for_status()
+        yield from response.iter_content(chunk_size)
+
+
+class _IssueCache:
+    """The most recently used issues, by id.  An issue that is not
+    accessible is cached as None.  The cache may be shared by several
+    threads."""
+
+    def __init__(self, max_entries):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, issue_id):
+        """Returns the cached issue, or _NOT_CACHED."""
+        with self._lock:
+            issue = self._entries.get(issue_id, _NOT_CACHED)
+            if issue is not _NOT_CACHED:
+                self._entries.move_to_end(issue_id)
+        return issue
+
+    def missing(self, issue_ids):
+        with self._lock:
+            return sorted(set(issue_ids) - self._entries.keys())
+
+    def put(self, issue_id, issue):
+        with self._lock:
+            self._entries[issue_id] = issue
+            self._entries.move_to_end(issue_id)
+            if len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedmineFetcher:
+    """Bulk access to Redmine issues.
+
+    Issues are paged at Redmine's maximum page size with their relations
+    included.  Redmine's issue index does not serve journals, children or
+    attachments, so those are retrieved with a single request per issue;
+    the returned resources are fully populated and never fall back to lazy
+    requests.
+
+    The issues of a project are streamed a page at a time, and only the
+    current page is held in memory.  The most recently listed or fetched
+    issues are cached by id, so that issues referred to by relations, which
+    are mostly close to each other, are seldom fetched twice.
+    """
+
+    def __init__(self, redmine, max_cached_issues=4096):
+        self.redmine = redmine
+        self._issues = _IssueCache(max_cached_issues)
+
+    def project(self, identifier):
+        return self.redmine.project.get(identifier)
+
+    def _page(self, filters, offset):
+        resources = self.redmine.issue.filter(**filters, offset=offset, limit=_PAGE_SIZE)
+        page = list(resources)
+        return page, resources.total_count
+
+    def pages(self, offset=0, **filters):
+        while True:
+            page, _ = self._page(filters, offset)
+            yield page
+            if len(page) < _PAGE_SIZE:
+                return
+            offset += _PAGE_SIZE
+
+    @staticmethod
+    def _project_filters(project):
+        # Only the issues of the project itself, not those of its
+        # subprojects, in ascending id order
+        return dict(project_id=project.id, subproject_id="!*", sort="id")
+
+    def issue_summaries(self, project):
+        """Iterates over the open issues of the project itself, in ascending
+        id order, without their relations.  The issues are not cached."""
+        for page in self.pages(**self._project_filters(project)):
+            yield from page
+
+    def issue_pages(self, project):
+        """Returns the number of open issues of the project itself (not of
+        its subprojects), and an iterator over pages of these issues in
+        ascending id order.  Only the first page is requested up front."""
+        filters = dict(self._project_filters(project), include=["relations"])
+        first, total_count = self._page(filters, 0)
+        rest = (
+            self.pages(offset=_PAGE_SIZE, **filters)
+            if len(first) == _PAGE_SIZE
+            else iter(())
+        )
+
+        def pages():
+            for page in itertools.chain([first], rest):
+                for issue in page:
+                    self._issues.put(issue.id, issue)
+                yield page
+
+        return total_count, pages()
+
+    def _load(self, issue_ids):
+        """Fetches issues, caches them and returns {issue id: issue, or None
+        if not accessible}."""
+        loaded = {}
+        issue_ids = sorted(issue_ids)
+        for start in range(0, len(issue_ids), _PAGE_SIZE):
+            chunk = issue_ids[start : start + _PAGE_SIZE]
+            loaded.update(dict.fromkeys(chunk))
+            for issue in self.redmine.issue.filter(
+                issue_id=",".join(map(str, chunk)), status_id="*", limit=_PAGE_SIZE
+            ):
+                loaded[issue.id] = issue
+        for issue_id, issue in loaded.items():
+            self._issues.put(issue_id, issue)
+        return loaded
+
+    def prefetch_issues(self, issue_ids):
+        self._load(self._issues.missing(issue_ids))
+
+    def issue(self, issue_id):
+        issue = self._issues.get(issue_id)
+        if issue is _NOT_CACHED:
+            issue = self._load([issue_id])[issue_id]
+        return issue
+
+    def _resource(self, raw):
+        raw = dict(raw)
+        for collection in _INCLUDED_COLLECTIONS:
+            if raw.get(collection) is None:
+                raw[collection] = []
+        return self.redmine.issue.to_resource(raw)
+
+    def user(self, user_id):
+        return self.redmine.user.get(user_id)
+
+    def wiki_pages(self, identifier):
+        return self.redmine.wiki_page.filter(project_id=identifier)
+
+    def populate(self, summary):
+        raw = self.redmine.issue.get(summary.id, include=["journals", "children", "attachments"]).raw()
+        raw = dict(raw, relations=summary.raw().get("relations"))
+        return self._resource(raw)
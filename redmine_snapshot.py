@@ -0,0 +1,361 @@
+from redminelib.exceptions import ForbiddenError, ResourceNotFoundError
+
+from redmine_fetcher import RedmineFetcher, _PAGE_SIZE
+
+import json
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    identifier TEXT PRIMARY KEY,
+    id INTEGER NOT NULL,
+    synced_on TEXT,
+    raw TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issue_statuses (
+    id INTEGER PRIMARY KEY,
+    is_closed INTEGER NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    project_id INTEGER NOT NULL,
+    status_id INTEGER NOT NULL,
+    updated_on TEXT NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issues_source ON issues (source);
+CREATE INDEX IF NOT EXISTS issues_project ON issues (project_id);
+CREATE TABLE IF NOT EXISTS journals (
+    id INTEGER PRIMARY KEY,
+    issue_id INTEGER NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journals_issue ON journals (issue_id);
+CREATE TABLE IF NOT EXISTS relations (
+    id INTEGER PRIMARY KEY,
+    issue_id INTEGER NOT NULL,
+    issue_to_id INTEGER NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS relations_issue ON relations (issue_id);
+CREATE TABLE IF NOT EXISTS children (
+    parent_id INTEGER NOT NULL,
+    child_id INTEGER NOT NULL,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (parent_id, child_id)
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    raw TEXT  -- NULL if the user is not visible to us
+);
+CREATE TABLE IF NOT EXISTS wiki_pages (
+    project TEXT NOT NULL,
+    title TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_on TEXT NOT NULL,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (project, title)
+);
+"""
+
+
+class RedmineSnapshot:
+    """Local SQLite mirror of Redmine projects.
+
+    Issues are stored together with their journals, relations and
+    children, along with the users they mention and the metadata (including
+    attachments) of each project's wiki pages.  A refresh only requests
+    issues whose updated_on is at or after the most recent one already
+    mirrored for the project; a full refresh starts the project over, which
+    also drops issues that were deleted or moved away.
+
+    Users are only requested the first time they are mentioned, and wiki
+    pages only when their version changed.  A full refresh requests the
+    users mentioned in the project again.
+    """
+
+    def __init__(self, path):
+        # The snapshot may be read from several threads at once.
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._db.close()
+
+    def _upsert_issue(self, source, raw):
+        issue_id = raw["id"]
+        journals = raw.pop("journals", None) or []
+        relations = raw.pop("relations", None) or []
+        children = raw.pop("children", None) or []
+        self._db.execute(
+            "REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                issue_id,
+                source,
+                raw["project"]["id"],
+                raw["status"]["id"],
+                raw["updated_on"],
+                json.dumps(raw),
+            ),
+        )
+        for table, column in (
+            ("journals", "issue_id"),
+            ("relations", "issue_id"),
+            ("children", "parent_id"),
+        ):
+            self._db.execute(f"DELETE FROM {table} WHERE {column} = ?", (issue_id,))
+        self._db.executemany(
+            "INSERT INTO journals VALUES (?, ?, ?)",
+            [(j["id"], issue_id, json.dumps(j)) for j in journals],
+        )
+        self._db.executemany(
+            "REPLACE INTO relations VALUES (?, ?, ?, ?)",
+            [(r["id"], issue_id, r["issue_to_id"], json.dumps(r)) for r in relations],
+        )
+        self._db.executemany(
+            "INSERT INTO children VALUES (?, ?, ?)",
+            [(issue_id, c["id"], json.dumps(c)) for c in children],
+        )
+        return {j["user"]["id"] for j in journals if "user" in j}
+
+    def _refresh_users(self, redmine, user_ids, full):
+        known = set() if full else {row[0] for row in self._db.execute("SELECT id FROM users")}
+        for user_id in sorted(user_ids - known):
+            try:
+                raw = json.dumps(redmine.user.get(user_id).raw())
+            except (ResourceNotFoundError, ForbiddenError):
+                raw = None
+            self._db.execute("REPLACE INTO users VALUES (?, ?)", (user_id, raw))
+
+    def _refresh_wiki(self, redmine, identifier):
+        versions = dict(
+            self._db.execute(
+                "SELECT title, version FROM wiki_pages WHERE project = ?", (identifier,)
+            )
+        )
+        titles = set()
+        for page in redmine.wiki_page.filter(project_id=identifier):
+            titles.add(page.title)
+            if versions.get(page.title) == page.version:
+                continue
+            # The wiki index does not list attachments.
+            raw = redmine.wiki_page.get(
+                page.title, project_id=identifier, include=["attachments"]
+            ).raw()
+            raw = {k: v for k, v in raw.items() if k != "text"}
+            self._db.execute(
+                "REPLACE INTO wiki_pages VALUES (?, ?, ?, ?, ?)",
+                (identifier, page.title, raw["version"], raw["updated_on"], json.dumps(raw)),
+            )
+        for title in versions.keys() - titles:
+            self._db.execute(
+                "DELETE FROM wiki_pages WHERE project = ? AND title = ?",
+                (identifier, title),
+            )
+
+    def refresh(self, redmine, identifier, full=False):
+        """Mirror one project; returns the number of issues that were pulled."""
+        fetcher = RedmineFetcher(redmine)
+        project = fetcher.project(identifier)
+
+        if full:
+            self._db.execute("DELETE FROM projects WHERE identifier = ?", (identifier,))
+            for row in self._db.execute(
+                "SELECT id FROM issues WHERE source = ?", (identifier,)
+            ).fetchall():
+                for table, column in (
+                    ("journals", "issue_id"),
+                    ("relations", "issue_id"),
+                    ("children", "parent_id"),
+                    ("issues", "id"),
+                ):
+                    self._db.execute(f"DELETE FROM {table} WHERE {column} = ?", row)
+
+        row = self._db.execute(
+            "SELECT synced_on FROM projects WHERE identifier = ?", (identifier,)
+        ).fetchone()
+        synced_on = row[0] if row is not None else None
+
+        # Subprojects are mirrored on their own; listing their issues here
+        # would record them as issues of this project.
+        filters = dict(
+            project_id=project.id,
+            subproject_id="!*",
+            status_id="*",
+            include=["relations"],
+        )
+        if synced_on is not None:
+            filters["updated_on"] = f">={synced_on}"
+
+        user_ids = set()
+        n_issues = 0
+        for page in fetcher.pages(**filters):
+            for summary in page:
+                raw = dict(fetcher.populate(summary).raw())
+                user_ids.add(raw["author"]["id"])
+                if "assigned_to" in raw:
+                    user_ids.add(raw["assigned_to"]["id"])
+                user_ids |= self._upsert_issue(identifier, raw)
+                if synced_on is None or raw["updated_on"] > synced_on:
+                    synced_on = raw["updated_on"]
+                n_issues += 1
+
+        self._refresh_users(redmine, user_ids, full)
+        self._refresh_wiki(redmine, identifier)
+        self._db.executemany(
+            "REPLACE INTO issue_statuses VALUES (?, ?, ?)",
+            [
+                (status.id, int(status.raw().get("is_closed", False)), json.dumps(status.raw()))
+                for status in redmine.issue_status.all()
+            ],
+        )
+        self._db.execute(
+            "REPLACE INTO projects VALUES (?, ?, ?, ?)",
+            (identifier, project.id, synced_on, json.dumps(project.raw())),
+        )
+        self._db.commit()
+        return n_issues
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def project(self, identifier):
+        rows = self._query("SELECT raw FROM projects WHERE identifier = ?", (identifier,))
+        return json.loads(rows[0][0]) if rows else None
+
+    # Mirrors Redmine's default of listing open issues only.
+    _OPEN_ISSUES = (
+        " FROM issues"
+        " LEFT JOIN issue_statuses ON issues.status_id = issue_statuses.id"
+        " WHERE project_id = ? AND NOT IFNULL(is_closed, 0)"
+    )
+
+    def count_open_issues(self, project_id):
+        return self._query("SELECT COUNT(*)" + self._OPEN_ISSUES, (project_id,))[0][0]
+
+    def open_issues(self, project_id, after_id, limit):
+        """Returns, with their relations, the open issues of the project
+        itself (not of its subprojects) whose id follows after_id."""
+        issues = [
+            json.loads(raw)
+            for raw, in self._query(
+                "SELECT issues.raw" + self._OPEN_ISSUES + " AND issues.id > ?"
+                " ORDER BY issues.id LIMIT ?",
+                (project_id, after_id, limit),
+            )
+        ]
+        relations = {issue["id"]: [] for issue in issues}
+        for issue_id, raw in self._query(
+            "SELECT issue_id, raw FROM relations WHERE issue_id IN"
+            f" ({', '.join('?' * len(issues))}) ORDER BY rowid",
+            tuple(relations),
+        ):
+            relations[issue_id].append(json.loads(raw))
+        for issue in issues:
+            issue["relations"] = relations[issue["id"]]
+        return issues
+
+    def issue(self, issue_id):
+        rows = self._query("SELECT raw FROM issues WHERE id = ?", (issue_id,))
+        if not rows:
+            return None
+        raw = json.loads(rows[0][0])
+        for table, column, key in (
+            ("journals", "issue_id", "journals"),
+            ("relations", "issue_id", "relations"),
+            ("children", "parent_id", "children"),
+        ):
+            raw[key] = [
+                json.loads(r)
+                for r, in self._query(
+                    f"SELECT raw FROM {table} WHERE {column} = ? ORDER BY rowid",
+                    (issue_id,),
+                )
+            ]
+        return raw
+
+    def user(self, user_id):
+        rows = self._query("SELECT raw FROM users WHERE id = ?", (user_id,))
+        return json.loads(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def wiki_pages(self, identifier):
+        return [
+            json.loads(raw)
+            for raw, in self._query(
+                "SELECT raw FROM wiki_pages WHERE project = ? ORDER BY title",
+                (identifier,),
+            )
+        ]
+
+
+class SnapshotFetcher(RedmineFetcher):
+    """RedmineFetcher that reads from a RedmineSnapshot.
+
+    Issues that are not part of the snapshot (e.g. relation targets in
+    projects that were not mirrored) are still fetched from Redmine.
+    """
+
+    def __init__(self, redmine, snapshot):
+        super().__init__(redmine)
+        self._snapshot = snapshot
+
+    def project(self, identifier):
+        raw = self._snapshot.project(identifier)
+        if raw is None:
+            raise ResourceNotFoundError
+        return self.redmine.project.to_resource(raw)
+
+    def issue_pages(self, project):
+        def pages():
+            after_id = 0
+            while True:
+                page = [
+                    self._resource(raw)
+                    for raw in self._snapshot.open_issues(project.id, after_id, _PAGE_SIZE)
+                ]
+                yield page
+                if len(page) < _PAGE_SIZE:
+                    return
+                after_id = page[-1].id
+
+        return self._snapshot.count_open_issues(project.id), pages()
+
+    def issue_summaries(self, project):
+        for page in self.issue_pages(project)[1]:
+            yield from page
+
+    def _load(self, issue_ids):
+        loaded = {}
+        missing = []
+        for issue_id in issue_ids:
+            raw = self._snapshot.issue(issue_id)
+            if raw is None:
+                missing.append(issue_id)
+            else:
+                loaded[issue_id] = self._resource(raw)
+                self._issues.put(issue_id, loaded[issue_id])
+        loaded.update(super()._load(missing))
+        return loaded
+
+    def populate(self, summary):
+        raw = self._snapshot.issue(summary.id)
+        if raw is None:
+            # E.g. an issue adopted from GitHub that is no longer open, or
+            # that was created after the snapshot was refreshed.
+            return super().populate(summary)
+        return self._resource(raw)
+
+    def user(self, user_id):
+        raw = self._snapshot.user(user_id)
+        if raw is None:
+            raise ResourceNotFoundError
+        return self.redmine.user.to_resource(raw)
+
+    def wiki_pages(self, identifier):
+        manager = self.redmine.wiki_page.new_manager("WikiPage", project_id=identifier)
+        return [manager.to_resource(raw) for raw in self._snapshot.wiki_pages(identifier)]
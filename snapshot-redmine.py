@@ -0,0 +1,52 @@
+#!/bin/env python3
+
+from redminelib import Redmine
+
+from termcolor import colored
+
+import settings
+from redmine_snapshot import RedmineSnapshot
+from repositories_to_migrate import FNAL_REDMINE_REPOS
+
+import argparse
+
+_FNAL_REDMINE_URL = "https://cdcvs.fnal.gov/redmine/"
+
+_GREEN_CHECKMARK = colored("\u2714", "green")
+
+
+def snapshot(parsed_args):
+    redmine = Redmine(
+        _FNAL_REDMINE_URL,
+        username=settings.REDMINE_USERNAME,
+        key=settings.REDMINE_API_PUBLIC_KEY,
+    )
+
+    redmine_snapshot = RedmineSnapshot(parsed_args.snapshot)
+    for repo in FNAL_REDMINE_REPOS:
+        n_issues = redmine_snapshot.refresh(redmine, repo, full=parsed_args.full)
+        print(f"  {_GREEN_CHECKMARK} Pulled {n_issues} updated {repo} issues")
+    redmine_snapshot.close()
+
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mirror FNAL Redmine projects into a local SQLite snapshot."
+    )
+    parser.add_argument(
+        "--snapshot",
+        default="redmine-snapshot.sqlite",
+        help="Path of the snapshot file (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Discard the mirrored issues and download every project again.",
+    )
+
+    args = parser.parse_args()
+    snapshot(args)
+
+    print(f"Snapshot written to {args.snapshot}.")
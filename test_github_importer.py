@@ -0,0 +1,104 @@
+from github_importer import IssueImporter
+from migration_ledger import MigrationLedger
+
+
+class _RateLimiter:
+    def call(self, resource, method, *args, **kwargs):
+        return method(*args, **kwargs)
+
+
+class _Repo:
+    """Repository whose import API reports the statuses in polls, one list
+    of statuses per poll."""
+
+    url = "https://api.github.com/repos/org/art"
+
+    def __init__(self, polls):
+        self._requester = self
+        self._polls = polls
+        self.imports = []
+
+    def requestJsonAndCheck(self, verb, url, headers=None, input=None, parameters=None):
+        assert url == f"{self.url}/import/issues"
+        if verb == "POST":
+            self.imports.append(input)
+            return {}, {"id": len(self.imports), "created_at": "2021-06-01T12:00:00Z"}
+        return {}, self._polls.pop(0) if len(self._polls) > 1 else self._polls[0]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _imported(import_id, number):
+    return {
+        "id": import_id,
+        "status": "imported",
+        "issue_url": f"https://api.github.com/repos/org/art/issues/{number}",
+    }
+
+
+def _importer(ledger, timeout=600.0):
+    clock = _Clock()
+    importer = IssueImporter(
+        _RateLimiter(), ledger, timeout=timeout, sleep=clock.sleep, clock=clock
+    )
+    return importer, clock
+
+
+def _submit(importer, repo, redmine_id):
+    return importer.submit(
+        repo, redmine_id, f"Issue {redmine_id}", "Body", [], None, ["Comment"], redmine_id
+    )
+
+
+def test_wait():
+    ledger = MigrationLedger(":memory:")
+    pending = {"id": 1, "status": "pending"}
+    repo = _Repo([[pending], [pending], [_imported(1, 7), _imported(2, 8)]])
+    importer, clock = _importer(ledger)
+    assert _submit(importer, repo, 101)
+    assert _submit(importer, repo, 102)
+    assert repo.imports[0]["comments"] == [{"body": "Comment"}]
+
+    # Polls back off while imports are pending.
+    assert importer.wait() == [(101, 7, []), (102, 8, [])]
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_failed_import():
+    ledger = MigrationLedger(":memory:")
+    failed = {"id": 1, "status": "failed", "errors": [{"code": "invalid"}]}
+    repo = _Repo([[failed]])
+    importer, _ = _importer(ledger)
+    _submit(importer, repo, 101)
+    assert importer.wait() == [(101, None, [{"code": "invalid"}])]
+
+    # The next run submits the issue again.
+    assert ledger.submitted_import(101) is None
+
+
+def test_timeout():
+    ledger = MigrationLedger(":memory:")
+    repo = _Repo([[{"id": 1, "status": "pending"}]])
+    importer, clock = _importer(ledger, timeout=10.0)
+    _submit(importer, repo, 101)
+    assert importer.wait() == [(101, None, ["Import 1 still pending after 10 seconds"])]
+    assert clock.sleeps == [1.0, 2.0, 4.0, 8.0]
+
+    # The import stays recorded; the next run polls it instead of
+    # submitting the issue again.
+    repo = _Repo([[_imported(1, 7)]])
+    importer, _ = _importer(ledger)
+    assert not _submit(importer, repo, 101)
+    assert repo.imports == []
+    assert importer.wait() == [(101, 7, [])]
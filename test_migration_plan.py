@@ -0,0 +1,29 @@
+from migration_plan import MigrationPlan
+
+
+def test_predicted_numbers():
+    plan = MigrationPlan("org")
+    plan.add_repo("art", 11, [101, 102, 103, 104])
+    plan.add_repo("canvas", 1, [201])
+    assert plan.predicted_url(101) == "https://github.com/org/art/issues/11"
+    assert plan.predicted_url(104) == "https://github.com/org/art/issues/14"
+    assert plan.predicted_url(201) == "https://github.com/org/canvas/issues/1"
+    assert plan.predicted_url(301) is None
+
+
+def test_corrected_predictions():
+    plan = MigrationPlan("org")
+    plan.add_repo("art", 11, [101, 102, 103, 104])
+
+    # A pull request was opened before the first issue was created.
+    plan.created(101, 12)
+    assert plan.predicted_url(101) is None
+    assert plan.predicted_url(102) == "https://github.com/org/art/issues/13"
+
+    # A skipped issue takes no number.
+    plan.skipped(102)
+    assert plan.predicted_url(103) == "https://github.com/org/art/issues/13"
+    assert plan.predicted_url(104) == "https://github.com/org/art/issues/14"
+
+    plan.created(103, 13)
+    assert plan.predicted_url(104) == "https://github.com/org/art/issues/14"
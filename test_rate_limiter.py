@@ -0,0 +1,136 @@
+from github import GithubException
+from rate_limiter import CORE, SEARCH, SECONDARY, RateLimiter
+
+import pytest
+
+
+class _Github:
+    """Rate-limit values of the latest response, as PyGithub records them."""
+
+    def __init__(self, remaining=5000, reset=0):
+        self.rate_limiting = (remaining, 5000)
+        self.rate_limiting_resettime = reset
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _limiter(gh):
+    clock = _Clock()
+    return RateLimiter(gh, clock=clock, sleep=clock.sleep), clock
+
+
+def test_budget_left():
+    gh = _Github(remaining=4000, reset=2000)
+    limiter, clock = _limiter(gh)
+    for _ in range(10):
+        assert limiter.call(CORE, lambda: "result") == "result"
+    assert clock.sleeps == []
+
+
+def test_budget_exhausted():
+    # Calls wait until the budget resets once only the reserve is left.
+    gh = _Github(remaining=11, reset=1030)
+    limiter, clock = _limiter(gh)
+    limiter.call(CORE, lambda: None)
+    assert clock.sleeps == []
+
+    gh.rate_limiting = (10, 5000)
+    limiter.call(CORE, lambda: None)
+    assert clock.sleeps == []
+    limiter.call(CORE, lambda: None)
+    assert clock.sleeps == [30.0]
+
+    # Other budgets are not affected.
+    limiter.call(SEARCH, lambda: None)
+    assert clock.sleeps == [30.0]
+
+
+def test_update_refreshes_budget():
+    gh = _Github(remaining=0, reset=1060)
+    limiter, clock = _limiter(gh)
+    limiter.update(CORE)
+
+    # The budget was reset since, as the headers of a response show.
+    gh.rate_limiting = (5000, 5000)
+    gh.rate_limiting_resettime = 4600
+    limiter.update(CORE)
+    limiter.call(CORE, lambda: None)
+    assert clock.sleeps == []
+
+
+def test_secondary_limit():
+    # Content-creating calls are spaced one second apart, and also count
+    # against the core budget.
+    gh = _Github(remaining=11, reset=2000)
+    limiter, clock = _limiter(gh)
+    limiter.call(SECONDARY, lambda: None)
+    limiter.call(SECONDARY, lambda: None)
+    assert clock.sleeps == [1.0]
+
+    gh.rate_limiting = (10, 5000)
+    limiter.call(SECONDARY, lambda: None)
+    limiter.call(SECONDARY, lambda: None)
+    assert clock.sleeps == [1.0, 1.0, 998.0]
+
+
+def _failing(*exceptions):
+    exceptions = list(exceptions)
+
+    def method():
+        if exceptions:
+            raise exceptions.pop(0)
+        return "result"
+
+    return method
+
+
+def test_secondary_limit_backoff():
+    gh = _Github()
+    limiter, clock = _limiter(gh)
+    exceeded = GithubException(
+        403, {"message": "You have exceeded a secondary rate limit."}, {}
+    )
+    method = _failing(exceeded, exceeded)
+    assert limiter.call(SECONDARY, method) == "result"
+    assert clock.sleeps == [120.0, 240.0]
+
+
+def test_retry_after():
+    gh = _Github()
+    limiter, clock = _limiter(gh)
+    exception = GithubException(429, {}, {"Retry-After": "7"})
+    assert limiter.call(CORE, _failing(exception)) == "result"
+    assert clock.sleeps == [7.0]
+
+    # Other callers of the budget wait until the retry.
+    assert limiter.backoff(SEARCH, exception, 1) == 7.0
+    limiter.acquire(SEARCH)
+    assert clock.sleeps == [7.0, 7.0]
+
+
+def test_other_errors():
+    gh = _Github()
+    limiter, clock = _limiter(gh)
+    with pytest.raises(GithubException):
+        limiter.call(CORE, _failing(GithubException(404, {"message": "Not Found"}, {})))
+    assert clock.sleeps == []
+
+
+def test_retries_exhausted():
+    gh = _Github()
+    limiter, clock = _limiter(gh)
+    exceeded = GithubException(429, {}, {"Retry-After": "1"})
+    with pytest.raises(GithubException):
+        limiter.call(CORE, _failing(*[exceeded] * 4))
+    assert clock.sleeps == [1.0] * 3
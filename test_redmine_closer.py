@@ -0,0 +1,63 @@
+from fake_redmine import FakeRedmine
+from migration_ledger import MigrationLedger
+from redmine_closer import RedmineCloser
+
+
+def _notes(redmine, issue_id):
+    return [journal["notes"] for journal in redmine.journals[issue_id]]
+
+
+def test_close_issues():
+    redmine = FakeRedmine()
+    redmine.add_project("art", 1)
+    for issue_id in (1, 2, 3):
+        redmine.add_issue(issue_id, "art")
+    redmine.issues[3]["status"] = {"id": 5, "name": "Closed"}
+    redmine.failing_updates.add(2)
+    ledger = MigrationLedger(":memory:")
+    for issue_id in (1, 2, 3):
+        ledger.record_issue(issue_id, "art", issue_id, f"https://github.com/org/art/issues/{issue_id}")
+
+    closer = RedmineCloser(redmine.client, ledger, workers=2)
+    closer.submit(1, "https://github.com/org/art/issues/1")
+    closer.submit(2, "https://github.com/org/art/issues/2")
+    closer.submit(3, "https://github.com/org/art/issues/3", status_id=5)
+    closed, failures = closer.finish()
+    assert (sorted(closed), failures) == ([1, 2, 3], {})
+
+    # The failed update was retried; the closed issue was only verified.
+    assert _notes(redmine, 1) == ["This issue has moved to https://github.com/org/art/issues/1"]
+    assert _notes(redmine, 2) == ["This issue has moved to https://github.com/org/art/issues/2"]
+    assert _notes(redmine, 3) == []
+    assert all(ledger.get(issue_id).redmine_closed for issue_id in (1, 2, 3))
+
+
+def test_note_posted_once():
+    # An earlier run posted the note, but the issue was reopened since.
+    redmine = FakeRedmine()
+    redmine.add_project("art", 1)
+    redmine.add_issue(1, "art", notes=["This issue has moved to https://github.com/org/art/issues/1"])
+    ledger = MigrationLedger(":memory:")
+    ledger.record_issue(1, "art", 1, "https://github.com/org/art/issues/1")
+    ledger.record_redmine_note(1)
+
+    closer = RedmineCloser(redmine.client, ledger, attempts=1)
+    closer.submit(1, "https://github.com/org/art/issues/1")
+    assert closer.finish() == ([1], {})
+    assert _notes(redmine, 1) == ["This issue has moved to https://github.com/org/art/issues/1"]
+    assert redmine.issues[1]["status"]["id"] == 5
+
+
+def test_report_failures():
+    redmine = FakeRedmine()
+    redmine.add_project("art", 1)
+    redmine.add_issue(1, "art")
+    redmine.failing_updates.add(1)
+    ledger = MigrationLedger(":memory:")
+
+    closer = RedmineCloser(redmine.client, ledger, attempts=1)
+    closer.submit(1, "https://github.com/org/art/issues/1")
+    closed, failures = closer.finish()
+    assert closed == []
+    assert failures[1].startswith("Update failed: ServerError")
+    assert not ledger.redmine_noted(1)
@@ -0,0 +1,81 @@
+from fake_redmine import FakeRedmine
+from redmine_fetcher import RedmineFetcher
+
+
+def _redmine():
+    redmine = FakeRedmine()
+    redmine.add_project("art", 1)
+    redmine.add_project("canvas", 2)
+    for issue_id in range(1, 251):
+        redmine.add_issue(issue_id, "art", relations=[issue_id + 1], notes=["Comment"])
+    for issue_id in range(251, 261):
+        redmine.add_issue(issue_id, "canvas", relations=[1])
+    return redmine
+
+
+def test_issue_pages():
+    redmine = _redmine()
+    fetcher = RedmineFetcher(redmine.client)
+    project = fetcher.project("art")
+
+    # Only the first page is requested up front.
+    total_count, pages = fetcher.issue_pages(project)
+    assert total_count == 250
+    assert len(redmine.listings()) == 1
+    assert redmine.listings()[0]["subproject_id"] == "!*"
+
+    pages = list(pages)
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert [issue.id for page in pages for issue in page] == list(range(1, 251))
+    assert pages[0][0].relations[0].issue_to_id == 2
+    assert len(redmine.listings()) == 3
+
+
+def test_issue_summaries():
+    redmine = _redmine()
+    fetcher = RedmineFetcher(redmine.client)
+    summaries = fetcher.issue_summaries(fetcher.project("canvas"))
+    assert [issue.id for issue in summaries] == list(range(251, 261))
+    assert "include" not in redmine.listings()[0]
+
+
+def test_relation_targets():
+    redmine = _redmine()
+    fetcher = RedmineFetcher(redmine.client)
+    for page in fetcher.issue_pages(fetcher.project("art"))[1]:
+        pass
+
+    # Listed issues are cached; others are fetched in a single request.
+    del redmine.requests[:]
+    assert fetcher.issue(250).subject == "Issue 250"
+    fetcher.prefetch_issues([250, 251, 252, 999])
+    assert len(redmine.requests) == 1
+    assert fetcher.issue(252).subject == "Issue 252"
+    assert fetcher.issue(999) is None
+    assert len(redmine.requests) == 1
+
+
+def test_bounded_cache():
+    redmine = _redmine()
+    fetcher = RedmineFetcher(redmine.client, max_cached_issues=2)
+    fetcher.prefetch_issues([1, 2])
+    fetcher.issue(1)
+    fetcher.issue(3)  # Evicts issue 2, the least recently used
+    del redmine.requests[:]
+    fetcher.issue(1)
+    assert redmine.requests == []
+    fetcher.issue(2)
+    assert len(redmine.requests) == 1
+
+
+def test_populate():
+    redmine = _redmine()
+    fetcher = RedmineFetcher(redmine.client)
+    summary = next(fetcher.issue_pages(fetcher.project("canvas"))[1])[0]
+    issue = fetcher.populate(summary)
+    assert [relation.issue_to_id for relation in issue.relations] == [1]
+    assert [journal.notes for journal in issue.journals] == []
+    assert list(issue.children) == []
+
+    issue = fetcher.populate(fetcher.issue(1))
+    assert [journal.notes for journal in issue.journals] == ["Comment"]
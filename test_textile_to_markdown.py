@@ -1,4 +1,6 @@
-from textile_to_markdown import TextileToMarkdown
+from textile_to_markdown import ConversionCache, TextileToMarkdown
+
+from concurrent.futures import ProcessPoolExecutor
 
 translator = TextileToMarkdown(github_org=None)
 to_md = translator.to_md
@@ -62,3 +64,90 @@ fn12. My reference"""
 def test_commit_hash():
     text = "commit:abcdefg"
     print(to_md(text, ""))
+
+
+def test_type_face_contents():
+    text = "*see bug #1234* and _fixed by commit:abc123_"
+    assert (
+        to_md(text, "art")
+        == "**see Redmine bug 1234** and *fixed by https://github.com/art-framework-suite/art/commit/abc123*"
+    )
+
+
+def test_issue_after_commit_hash():
+    # The hash is not the issue's tracker word; the former chain of
+    # substitutions made it one and left "commit:Redmine abc123 1234".
+    text = "commit:abc123 #1234 and art:commit:abc123 #1234"
+    assert to_md(text, "art") == (
+        "https://github.com/art-framework-suite/art/commit/abc123 #1234"
+        " and https://github.com/art-framework-suite/art/commit/abc123 #1234"
+    )
+
+
+def test_adjacent_references():
+    # A reference that directly follows another one is left as text; the
+    # former chain of substitutions rewrote the first one's output instead.
+    assert to_md("bug #123art:commit:abc123", "art") == (
+        "Redmine bug 123https://github.com/art-framework-suite/art/commit/abc123"
+    )
+    assert to_md("art:commit:abc123commit:deadbeef", "art") == (
+        "https://github.com/art-framework-suite/art/commit/abc123commit:deadbeef"
+    )
+
+
+def test_conversion_cache(tmp_path):
+    text = "h1. Heading\n\n* Item"
+    cache = ConversionCache(max_entries=1, directory=tmp_path)
+    cached_to_md = TextileToMarkdown(github_org=None, cache=cache).to_md
+    assert cached_to_md(text) == to_md(text)
+    assert cached_to_md(text) == to_md(text)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Evicted from memory, but still on disk
+    cached_to_md("Other text")
+    fresh_cache = ConversionCache(directory=tmp_path)
+    assert TextileToMarkdown(None, fresh_cache).to_md(text) == to_md(text)
+    assert (fresh_cache.hits, fresh_cache.misses) == (1, 0)
+
+
+def test_to_md_many():
+    # Enough text to be converted by the executor
+    texts = ["* Item %d\n%s" % (i, "_word_ " * 200) for i in range(100)]
+    texts += ["* Item 0", texts[0]]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = list(translator.to_md_many(texts, "", executor))
+    assert results == [to_md(text) for text in texts]
+
+
+def test_to_md_stream():
+    text = """h1. Build log
+
+Run *this*:
+<pre><code class="sh">
+make all
+
+make test
+</code>
+</pre>
+<pre>
+raw output
+</pre> and see [1].
+
+fn1. Reference"""
+    # Chunks need not be aligned with lines
+    chunks = [text[i : i + 7] for i in range(0, len(text), 7)]
+    assert "".join(translator.to_md_stream(chunks)) == to_md(text)
+
+
+def test_attachments():
+    text = 'See !plot.png! and attachment:"run log.txt".'
+    md = to_md(text)
+    assert md == "See ![plot.png](plot.png) and [run log.txt](<run log.txt>)."
+    urls = {
+        "plot.png": "https://example.com/1-plot.png",
+        "run log.txt": "https://example.com/2-run.log.txt",
+    }
+    assert translator.link_attachments(md, urls) == (
+        "See ![plot.png](https://example.com/1-plot.png)"
+        " and [run log.txt](https://example.com/2-run.log.txt)."
+    )
@@ -0,0 +1,103 @@
+from textile_to_markdown import TextileToMarkdown
+from wiki_publisher import WikiPublisher
+
+import json
+import pytest
+import subprocess
+
+
+def _git(*args):
+    return subprocess.run(
+        ["git", *args], check=True, capture_output=True, text=True
+    ).stdout
+
+
+def _download(project, pages, attachments):
+    project.mkdir(parents=True, exist_ok=True)
+    manifest = {"pages": {}, "attachments": {}}
+    for title, (version, text) in pages.items():
+        (project / f"{title}.textile").write_text(text)
+        manifest["pages"][title] = {
+            "version": version,
+            "updated_on": "2020-01-01",
+            "file": f"{title}.textile",
+        }
+    for attachment_id, (filename, data) in attachments.items():
+        (project / filename).write_bytes(data)
+        manifest["attachments"][attachment_id] = {
+            "filename": filename,
+            "filesize": len(data),
+            "digest": None,
+            "sha256": str(hash(data)),
+        }
+    (project / "manifest.json").write_text(json.dumps(manifest))
+
+
+def test_publish_to_bare_repository(tmp_path, monkeypatch):
+    for variable in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{variable}_NAME", "Test")
+        monkeypatch.setenv(f"GIT_{variable}_EMAIL", "test@example.com")
+    # The clone defaults to main; GitHub only shows the master branch.
+    _git("init", "--quiet", "--bare", "--initial-branch=main", str(tmp_path / "art.wiki.git"))
+    project = tmp_path / "redmine" / "art"
+    publisher = WikiPublisher(
+        TextileToMarkdown(None),
+        "org",
+        str(tmp_path / "clones"),
+        f"{tmp_path}/{{}}.wiki.git",
+    )
+
+    _download(
+        project,
+        {
+            "Wiki": (1, "h1. Welcome\n\nSee [[Getting started|the guide]] and !plot.png!"),
+            "Getting_started": (1, "* Build with [[cetlib:Wiki]]\n"),
+        },
+        {"7": ("plot.png", b"PNG")},
+    )
+    assert publisher.publish(str(project), "art", "Migrate art wiki") == (3, 0)
+
+    heads = _git("ls-remote", "--heads", str(tmp_path / "art.wiki.git"))
+    assert heads.split()[1::2] == ["refs/heads/master"]
+    checkout = tmp_path / "checkout"
+    _git("clone", "--quiet", "--branch=master", str(tmp_path / "art.wiki.git"), str(checkout))
+    assert sorted(p.name for p in checkout.iterdir() if p.name != ".git") == [
+        "Getting_started.md",
+        "Home.md",
+        "attachments",
+    ]
+    assert (checkout / "Home.md").read_text() == (
+        "# Welcome\n\nSee [[the guide|Getting_started]] and ![plot.png]"
+        "(https://raw.githubusercontent.com/wiki/org/art/attachments/plot.png)"
+    )
+    assert (checkout / "Getting_started.md").read_text() == (
+        "- Build with [Wiki](https://github.com/org/cetlib/wiki/Home)\n"
+    )
+    assert (checkout / "attachments" / "plot.png").read_bytes() == b"PNG"
+
+    # Nothing changed since
+    assert publisher.publish(str(project), "art", "Migrate art wiki") is None
+
+    # Only the changed page is written; the removed page is deleted.
+    _download(project, {"Wiki": (2, "h1. Welcome back\n")}, {"7": ("plot.png", b"PNG")})
+    assert publisher.publish(str(project), "art", "Update art wiki") == (1, 1)
+    _git("-C", str(checkout), "pull", "--quiet")
+    log = _git("-C", str(checkout), "log", "--format=%s")
+    assert log == "Update art wiki\nMigrate art wiki\n"
+    assert (checkout / "Home.md").read_text() == "# Welcome back\n"
+    assert not (checkout / "Getting_started.md").exists()
+
+
+def test_publish_without_wiki_repository(tmp_path):
+    # GitHub only creates the repository with the first page of the wiki.
+    project = tmp_path / "redmine" / "art"
+    _download(project, {"Wiki": (1, "h1. Welcome\n")}, {})
+    publisher = WikiPublisher(
+        TextileToMarkdown(None),
+        "org",
+        str(tmp_path / "clones"),
+        f"{tmp_path}/{{}}.wiki.git",
+    )
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        publisher.publish(str(project), "art", "Migrate art wiki")
+    assert "art.wiki.git" in e.value.stderr
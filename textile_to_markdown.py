@@ -1,102 +1,488 @@
 from repositories_to_migrate import GITHUB_ORG
+
+from collections import OrderedDict
+
+import hashlib
+import itertools
+import os
 import re
+import threading
 
+# Part of every cache key; bump it whenever the conversion output changes,
+# so that stale cached conversions are not reused.
+_CONVERTER_VERSION = 5
 
-def to_md_normal(result, repo):
-    # Unordered lists
-    result = re.sub(r"^\* ", "- ", result, flags=re.MULTILINE)
-    result = re.sub(r"^\*\* ", "\t- ", result, flags=re.MULTILINE)
+# Batches with less text than this (about 10 ms worth of conversion) are
+# converted in-process; sending them to worker processes would cost more
+# than the conversion itself.
+_MIN_PARALLEL_CHARS = 1 << 16
 
-    # Ordered lists
-    result = re.sub(r"^\# ", "1. ", result, flags=re.MULTILINE)
-    result = re.sub(r"^\#\# ", "\t1. ", result, flags=re.MULTILINE)
+# Text outside code blocks is streamed a paragraph at a time; very long
+# paragraphs are cut at a line boundary after this many characters.
+_MAX_PARAGRAPH = 1 << 16
 
-    # Type face
-    result = re.sub(r"\*(.*?)\*", r"**\1**", result)  # Bold-face
-    result = re.sub(r"\b\_(.*?)\_\b", r"*\1*", result)  # Italicized
+# Text that every match of a rule contains.  Rules whose trigger is not in
+# the text are left out of the expression it is converted with.
+_TRIGGERS = {
+    "bold": "*",
+    "italic": "_",
+    "image": "!",
+    "attachment": "attachment:",
+    "footnote_ref": "[",
+    "issue": "#",
+    "repo_commit": ":commit:",
+    "commit": "commit:",
+}
 
-    # Headings
-    result = re.sub(r"^h1\.", "#", result, flags=re.MULTILINE)
-    result = re.sub(r"^h2\.", "##", result, flags=re.MULTILINE)
-    result = re.sub(r"^h3\.", "###", result, flags=re.MULTILINE)
-    result = re.sub(r"^h4\.", "####", result, flags=re.MULTILINE)
 
-    # Footnotes
-    result = re.sub(r"\[(\d+)\]", r"[^\1]", result)
-    result = re.sub(r"^fn(\d+)\. ", r"[^\1]: ", result, flags=re.MULTILINE)
+class _RuleSet:
+    """Textile rules combined into a single regular expression.
 
-    # Issues
-    result = re.sub(r"(\w+)\s+\#(\d{3,5})", r"Redmine \1 \2", result)
+    The rules are tried in order at each position of the text, and the
+    text is converted in one pass, each match being replaced by its rule's
+    callback.  Rules anchored at the start of a line come first and share
+    a single alternative.
 
-    # Commit references
-    result = re.sub(
-        r"(\w+):commit:([a-f0-9]+)",
-        f"https://github.com/{GITHUB_ORG}/" + r"\1/commit/\2",
-        result,
+    Every alternative is tried at every position, so the expression is
+    only made of the rules that can match the text (see _TRIGGERS); one is
+    compiled for each combination of triggers that is met.
+    """
+
+    def __init__(self, rules, flags=0):
+        self._rules = rules
+        self._flags = flags
+        self._replacements = {name: replace for name, _, replace in rules}
+        self._triggers = sorted(
+            {_TRIGGERS[name] for name, _, _ in rules if name in _TRIGGERS}
+        )
+        self._patterns = {}
+
+    def _pattern(self, text):
+        present = tuple(trigger in text for trigger in self._triggers)
+        pattern = self._patterns.get(present)
+        if pattern is not None:
+            return pattern
+
+        triggers = {t for t, p in zip(self._triggers, present) if p}
+        line, other = [], []
+        for name, pattern, _ in self._rules:
+            if name in _TRIGGERS and _TRIGGERS[name] not in triggers:
+                continue
+            if pattern.startswith("^"):
+                line.append(f"(?P<{name}>{pattern[1:]})")
+            else:
+                other.append(f"(?P<{name}>{pattern})")
+        alternatives = ([f"^(?:{'|'.join(line)})"] if line else []) + other
+        # Text that no rule can match is left as it is.
+        pattern = re.compile("|".join(alternatives) or "(?!)", self._flags)
+        self._patterns[present] = pattern
+        return pattern
+
+    def sub(self, text, repo):
+        return self._pattern(text).sub(
+            lambda m: self._replacements[m.lastgroup](m, repo), text
+        )
+
+
+def _bold(inner):
+    return (
+        "bold",
+        r"\*(?P<bold_text>.*?)\*",
+        lambda m, repo: f"**{inner.sub(m['bold_text'], repo)}**",
     )
-    result = re.sub(
-        r"commit:([a-f0-9]+)",
-        f"https://github.com/{GITHUB_ORG}/{repo}/" + r"commit/\1",
-        result,
+
+
+def _italic(inner):
+    return (
+        "italic",
+        r"\b\_(?P<italic_text>.*?)\_\b",
+        lambda m, repo: f"*{inner.sub(m['italic_text'], repo)}*",
     )
 
-    return result
+
+# A commit hash is matched whole.  One that starts a reference to another
+# repository's commit is left to that rule, which takes precedence.
+_HASH_END = r"(?![a-f0-9])"
+_NOT_REFERENCE = rf"(?![a-f0-9]|\w*:commit:[a-f0-9]+{_HASH_END})"
+
+def _link_target(name):
+    return f"<{name}>" if " " in name else name
+
+
+def _attachment_link(m, repo):
+    name = m["quoted_attachment"] or m["attachment_name"]
+    return f"[{name}]({_link_target(name)})"
+
+
+_REFERENCE_RULES = [
+    # Images and attachments, linked by file name until the file is
+    # published (see TextileToMarkdown.link_attachments)
+    (
+        "image",
+        r"!(?P<image_align>[<>=]?)(?P<image_src>[^\s!()]+\.[^\s!()]+)(?:\((?P<image_alt>[^)\n]*)\))?!",
+        lambda m, repo: f"![{m['image_alt'] or m['image_src']}]({m['image_src']})",
+    ),
+    (
+        "attachment",
+        r'attachment:(?:"(?P<quoted_attachment>[^"\n]+)"|(?P<attachment_name>[^\s"]+?)(?=[.,;:!?)]?(?:\s|<|$)))',
+        _attachment_link,
+    ),
+    # Footnotes
+    ("footnote_ref", r"\[(?P<ref>\d+)\]", lambda m, repo: f"[^{m['ref']}]"),
+    # Issues
+    (
+        "issue",
+        r"(?P<issue_word>\w+)\s+\#(?P<issue_id>\d{3,5})",
+        lambda m, repo: f"Redmine {m['issue_word']} {m['issue_id']}",
+    ),
+    # Commit references
+    (
+        "repo_commit",
+        rf"(?P<commit_repo>\w+):commit:(?P<repo_sha>[a-f0-9]+){_HASH_END}",
+        lambda m, repo: f"https://github.com/{GITHUB_ORG}/{m['commit_repo']}/commit/{m['repo_sha']}",
+    ),
+    (
+        "commit",
+        rf"commit:(?P<sha>[a-f0-9]+){_NOT_REFERENCE}",
+        lambda m, repo: f"https://github.com/{GITHUB_ORG}/{repo}/commit/{m['sha']}",
+    ),
+]
+
+_LINE_RULES = [
+    # Unordered lists
+    ("bullet", r"^\* ", lambda m, repo: "- "),
+    ("nested_bullet", r"^\*\* ", lambda m, repo: "\t- "),
+    # Ordered lists
+    ("number", r"^\# ", lambda m, repo: "1. "),
+    ("nested_number", r"^\#\# ", lambda m, repo: "\t1. "),
+    # Headings
+    ("heading", r"^h(?P<level>[1-4])\.", lambda m, repo: "#" * int(m["level"])),
+    # Footnotes
+    ("footnote", r"^fn(?P<fn>\d+)\. ", lambda m, repo: f"[^{m['fn']}]: "),
+]
+
+# Bold-face and italicized text are converted together with their
+# contents; neither is nested within itself.
+_REFERENCES = _RuleSet(_REFERENCE_RULES)
+_IN_BOLD = _RuleSet([_italic(_REFERENCES)] + _REFERENCE_RULES)
+_IN_ITALIC = _RuleSet([_bold(_REFERENCES)] + _REFERENCE_RULES)
+_TEXT = _RuleSet(
+    _LINE_RULES + [_bold(_IN_BOLD), _italic(_IN_ITALIC)] + _REFERENCE_RULES,
+    flags=re.MULTILINE,
+)
+
+_FIELDS = re.compile(
+    r'(<pre>.*?</pre>|@.*?@|<code class=".*?">.*?</code>)', flags=re.DOTALL
+)
+_INLINE = re.compile(r"@(.*?)@")
+_CODE_INLINE = re.compile(r'<code class=".*?">(.*?)</code>')
+_CODE = re.compile(r'<code class="(.*?)">(.*?)</code>', flags=re.DOTALL)
+_PRE_INLINE = re.compile(r"<pre>(.*?)</pre>")
+_PRE_CODE = re.compile(
+    r'<pre>\n?<code class="([^"\n]*)">\n?(.*?)\n?</code>\n?</pre>', flags=re.DOTALL
+)
+_PRE = re.compile(r"<pre>\n?(.*?)^\n</pre>", flags=re.DOTALL)
+_CODE_OPEN = re.compile(r'\n?<code class="([^"\n]*)">\n?')
+_LINK_TARGET = re.compile(r"\]\((<[^>\n]+>|[^)\s]+)\)")
+
+
+def to_md_normal(result, repo):
+    return _TEXT.sub(result, repo)
 
 
 def to_md_inline(result):
-    result = re.sub(r"@(.*?)@", r"`\1`", result)
+    result = _INLINE.sub(r"`\1`", result)
     return result
 
 
 def to_md_code(result):
-    result = re.sub(
-        r'<code class=".*?">(.*?)</code>', r"`\1`", result
+    result = _CODE_INLINE.sub(
+        r"`\1`", result
     )  # GitHub cannot support inline syntax highlighting
-    result = re.sub(
-        r'<code class="(.*?)">(.*?)</code>', r"\1\2", result, flags=re.DOTALL
-    )  # Syntax highlighting
+    result = _CODE.sub(r"\1\2", result)  # Syntax highlighting
     return result
 
 
 def to_md_pre(result):
-    result = re.sub(
-        r"<pre>(.*?)</pre>", r"\n```\n\1\n```\n", result
-    )  # Inline code blocks
-    result = re.sub(
-        r'<pre>\n?<code class="(.*)">\n?(.*?)\n?</code>\n?</pre>',
-        r"\n```\1\n\2\n```\n",
-        result,
-        flags=re.DOTALL,
-    )  # Code blocks
-    result = re.sub(
-        r"<pre>\n?(.*?)^\n</pre>",
-        r"\n```\n\1\n```\n",
-        result,
-        flags=re.DOTALL,
+    result = _PRE_INLINE.sub(r"\n```\n\1\n```\n", result)  # Inline code blocks
+    result = _PRE_CODE.sub(r"\n```\1\n\2\n```\n", result)  # Code blocks
+    result = _PRE.sub(
+        r"\n```\n\1\n```\n", result
     )  # First make sure there are newlines after/before the pre tags
     return result
 
 
+def _to_md(textile_str, repo):
+    result = []
+    for f in _FIELDS.split(textile_str):
+        if f.startswith("<pre>"):
+            result.append(to_md_pre(f))
+        elif f.startswith("@"):
+            result.append(to_md_inline(f))
+        elif f.startswith("<code"):
+            result.append(to_md_code(f))
+        else:
+            result.append(to_md_normal(f, repo))
+
+    return "".join(result)
+
+
+def _unclosed_pre(line):
+    start = line.find("<pre>")
+    while start >= 0:
+        end = line.find("</pre>", start)
+        if end < 0:
+            return start
+        start = line.find("<pre>", end)
+    return -1
+
+
+def _may_open_code(head):
+    head = head[1:] if head.startswith("\n") else head
+    return '<code class="'.startswith(head) or (
+        head.startswith('<code class="') and "\n" not in head
+    )
+
+
+def _lines(chunks):
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if rest:
+        yield rest
+
+
+class _StreamConverter:
+    """Line-driven state machine behind TextileToMarkdown.to_md_stream.
+
+    Text is converted a paragraph at a time.  A <pre> block that spans
+    several lines is written out as it is read: with a Markdown code fence
+    if it holds a <code class="..."> element, verbatim otherwise.
+    """
+
+    def __init__(self, repo):
+        self._repo = repo
+        self._state = "text"  # "text", "head", "code", "code_end" or "pre"
+        self._paragraph = []
+        self._size = 0
+        self._head = ""
+        self._newline = ""  # Dropped if the code block closes next
+
+    def _flush(self):
+        md = _to_md("".join(self._paragraph), self._repo)
+        self._paragraph = []
+        self._size = 0
+        return md
+
+    def feed(self, line):
+        out = []
+        while line:
+            if self._state == "text":
+                start = _unclosed_pre(line)
+                if start < 0:
+                    self._paragraph.append(line)
+                    self._size += len(line)
+                    if not line.strip() or self._size > _MAX_PARAGRAPH:
+                        out.append(self._flush())
+                    break
+                self._paragraph.append(line[:start])
+                out.append(self._flush())
+                self._state = "head"
+                line = line[start + len("<pre>") :]
+            elif self._state == "head":
+                self._head += line
+                line = ""
+                m = _CODE_OPEN.match(self._head)
+                if m is not None:
+                    out.append(f"\n```{m[1]}\n")
+                    self._state = "code"
+                    self._newline = ""
+                    line = self._head[m.end() :]
+                elif not _may_open_code(self._head):
+                    out.append("<pre>")
+                    self._state = "pre"
+                    line = self._head
+                if self._state != "head":
+                    self._head = ""
+            elif self._state == "code":
+                end = line.find("</code>")
+                content = line if end < 0 else line[:end]
+                if content:
+                    out.append(self._newline)
+                    self._newline = ""
+                if end < 0:
+                    if content.endswith("\n"):
+                        content, self._newline = content[:-1], "\n"
+                    out.append(content)
+                    break
+                out.append(content + "\n```\n")
+                self._newline = ""
+                self._state = "code_end"
+                line = line[end + len("</code>") :]
+            elif self._state == "code_end":
+                end = line.find("</pre>")
+                if end < 0:
+                    out.append(line.strip())
+                    break
+                out.append(line[:end].strip())
+                self._state = "text"
+                line = line[end + len("</pre>") :]
+            else:
+                end = line.find("</pre>")
+                if end < 0:
+                    out.append(line)
+                    break
+                out.append(line[: end + len("</pre>")])
+                self._state = "text"
+                line = line[end + len("</pre>") :]
+        return out
+
+    def close(self):
+        if self._state == "head":
+            return ["<pre>" + self._head]
+        if self._state == "code":
+            return ["\n```\n"]
+        return [self._flush()]
+
+
+class ConversionCache:
+    """Cache of Markdown conversions, keyed by a hash of the Textile text,
+    the repository and the converter version.
+
+    The most recently used conversions are kept in memory.  If a directory
+    is given, every conversion is also stored there, so that later runs
+    do not convert the same text again.  The cache may be shared by
+    several threads.
+    """
+
+    def __init__(self, max_entries=4096, directory=None):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(textile_str, repo):
+        digest = hashlib.sha256(
+            f"{_CONVERTER_VERSION}\0{repo}\0{textile_str}".encode()
+        )
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.md")
+
+    def get(self, key):
+        with self._lock:
+            md = self._entries.get(key)
+            if md is not None:
+                self._entries.move_to_end(key)
+        if md is None and self.directory is not None:
+            try:
+                with open(self._path(key), encoding="utf-8", newline="") as f:
+                    md = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self._remember(key, md)
+
+        with self._lock:
+            if md is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return md
+
+    def _remember(self, key, md):
+        with self._lock:
+            self._entries[key] = md
+            if len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, md):
+        self._remember(key, md)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(md)
+        os.replace(tmp_path, path)
+
+
 class TextileToMarkdown:
-    def __init__(self, github_org):
+    def __init__(self, github_org, cache=None):
         self._gh_org = github_org
+        self._cache = cache
 
     def to_md(self, textile_str, repo=""):
-        fields = re.split(
-            r'(<pre>.*?</pre>|@.*?@|<code class=".*?">.*?</code>)',
-            textile_str,
-            flags=re.DOTALL,
-        )
+        if self._cache is None:
+            return _to_md(textile_str, repo)
 
-        result = ""
-        for f in fields:
-            if f.startswith("<pre>"):
-                result += to_md_pre(f)
-            elif f.startswith("@"):
-                result += to_md_inline(f)
-            elif f.startswith("<code"):
-                result += to_md_code(f)
-            else:
-                result += to_md_normal(f, repo)
+        key = self._cache.key(textile_str, repo)
+        md = self._cache.get(key)
+        if md is None:
+            md = _to_md(textile_str, repo)
+            self._cache.put(key, md)
+        return md
+
+    def to_md_many(self, textile_strs, repo="", executor=None, chunksize=4):
+        """Converts several texts, yielding the results in order.
+
+        Texts that are not cached are converted by the given executor
+        (e.g. a ProcessPoolExecutor), in chunks of chunksize texts, unless
+        there is too little text to be worth it.
+        """
+        textile_strs = list(textile_strs)
+        if self._cache is None:
+            keys = [None] * len(textile_strs)
+            cached = [None] * len(textile_strs)
+        else:
+            keys = [self._cache.key(t, repo) for t in textile_strs]
+            cached = [self._cache.get(key) for key in keys]
+
+        pending = [t for t, md in zip(textile_strs, cached) if md is None]
+        if executor is None or sum(map(len, pending)) < _MIN_PARALLEL_CHARS:
+            converted = (_to_md(t, repo) for t in pending)
+        else:
+            converted = executor.map(
+                _to_md, pending, itertools.repeat(repo), chunksize=chunksize
+            )
+
+        for key, md in zip(keys, cached):
+            if md is None:
+                md = next(converted)
+                if self._cache is not None:
+                    self._cache.put(key, md)
+            yield md
+
+    @staticmethod
+    def link_attachments(md, urls):
+        """Points the links to attachments in converted Markdown at the URLs
+        of the published files, given as {file name: URL}."""
+        if not urls:
+            return md
+
+        def replace(m):
+            target = m[1][1:-1] if m[1].startswith("<") else m[1]
+            url = urls.get(target)
+            return m[0] if url is None else f"]({url})"
+
+        return _LINK_TARGET.sub(replace, md)
 
-        return result
+    def to_md_stream(self, chunks, repo=""):
+        """Converts Textile read from an iterable of strings (e.g. the lines
+        of a file), yielding Markdown as soon as it is converted."""
+        converter = _StreamConverter(repo)
+        for line in _lines(chunks):
+            for md in converter.feed(line):
+                if md:
+                    yield md
+        for md in converter.close():
+            if md:
+                yield md
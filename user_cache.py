@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+import time
+
+_DAY = 24 * 60 * 60
+
+
+class UserCache:
+    """On-disk cache of GitHub logins keyed by Redmine user id.
+
+    Users that could not be resolved are cached as well (with a login of
+    None), so that an unmapped user does not cost a Redmine request and two
+    GitHub searches each time one of their comments is migrated.  Entries
+    older than the TTL are resolved again.
+    """
+
+    def __init__(self, path, ttl=30 * _DAY, clock=time.time):
+        self._path = path
+        self._ttl = ttl
+        self._clock = clock
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+
+    def get(self, user_id):
+        """Returns the cached entry of the user (a dict with "name" and
+        "login" keys), or None if the user must be resolved again."""
+        entry = self._entries.get(str(user_id))
+        if entry is None or self._clock() - entry["resolved_on"] > self._ttl:
+            return None
+        return entry
+
+    def put(self, user_id, name, login):
+        with self._lock:
+            self._entries[str(user_id)] = {
+                "name": name,
+                "login": login,
+                "resolved_on": self._clock(),
+            }
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._path)
+            self._dirty = False
@@ -0,0 +1,181 @@
+from redmine_fetcher import stream
+
+from concurrent.futures import ThreadPoolExecutor
+
+import hashlib
+import json
+import os
+import threading
+
+_CHUNK_SIZE = 1 << 16
+_MANIFEST = "manifest.json"
+
+
+def _write_atomically(path, chunks):
+    """Writes the chunks to path and returns their SHA-256 digest.  The file
+    is written next to path, then moved into place, so that an interrupted
+    download never leaves a truncated file behind."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    sha256 = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                sha256.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256.hexdigest()
+
+
+class WikiDownloader:
+    """Downloads the wiki pages of Redmine projects and their attachments.
+
+    Pages and attachments are downloaded on a pool of threads, attachments
+    being streamed to disk in chunks.  Each project directory keeps a
+    manifest of what was downloaded:
+
+        {"pages": {title: {"version", "updated_on", "file"}},
+         "attachments": {id: {"filename", "filesize", "digest", "sha256"}}}
+
+    A page is downloaded again only if its version or date changed, and an
+    attachment only if its size or digest changed.  Files that are gone from
+    Redmine are removed.
+    """
+
+    def __init__(self, redmine, workers=8, chunk_size=_CHUNK_SIZE):
+        self._redmine = redmine
+        self._workers = workers
+        self._chunk_size = chunk_size
+
+    @staticmethod
+    def load_manifest(project_directory):
+        try:
+            with open(os.path.join(project_directory, _MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"pages": {}, "attachments": {}}
+
+    @staticmethod
+    def _save_manifest(project_directory, manifest):
+        path = os.path.join(project_directory, _MANIFEST)
+        _write_atomically(path, [json.dumps(manifest, indent=2, sort_keys=True).encode()])
+
+    def _page_is_current(self, project_directory, entry, page):
+        return (
+            entry is not None
+            and entry["version"] == page.version
+            and entry["updated_on"] == str(page.updated_on)
+            and os.path.exists(os.path.join(project_directory, entry["file"]))
+        )
+
+    def _attachment_is_current(self, project_directory, entry, attachment):
+        return (
+            entry is not None
+            and entry["filename"] == attachment.filename
+            and entry["filesize"] == attachment.filesize
+            and entry["digest"] == getattr(attachment, "digest", None)
+            and os.path.exists(os.path.join(project_directory, attachment.filename))
+        )
+
+    def _download_page(self, project_directory, page):
+        filename = f"{page.title}.textile"
+        _write_atomically(
+            os.path.join(project_directory, filename),
+            stream(self._redmine, page.export_url("txt"), self._chunk_size),
+        )
+        return {
+            "version": page.version,
+            "updated_on": str(page.updated_on),
+            "file": filename,
+        }
+
+    def _download_attachment(self, project_directory, attachment):
+        sha256 = _write_atomically(
+            os.path.join(project_directory, attachment.filename),
+            stream(self._redmine, attachment.content_url, self._chunk_size),
+        )
+        return {
+            "filename": attachment.filename,
+            "filesize": attachment.filesize,
+            "digest": getattr(attachment, "digest", None),
+            "sha256": sha256,
+        }
+
+    def plan(self, project_directory, pages):
+        """Returns the pages and the attachments that are missing or out of
+        date, and the manifest they are compared to.  Listing the
+        attachments of a page may take a request, which is made on the
+        pool."""
+        manifest = self.load_manifest(project_directory)
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            attachments = executor.map(lambda page: list(page.attachments), pages)
+            attachments = {a.id: a for page_attachments in attachments for a in page_attachments}
+        stale_pages = [
+            page
+            for page in pages
+            if not self._page_is_current(
+                project_directory, manifest["pages"].get(page.title), page
+            )
+        ]
+        stale_attachments = [
+            attachment
+            for attachment in attachments.values()
+            if not self._attachment_is_current(
+                project_directory, manifest["attachments"].get(str(attachment.id)), attachment
+            )
+        ]
+        return stale_pages, stale_attachments, attachments, manifest
+
+    def download(self, project_directory, pages):
+        """Brings the project directory up to date with the pages; returns
+        the number of pages and of attachments that were downloaded."""
+        os.makedirs(project_directory, exist_ok=True)
+        stale_pages, stale_attachments, attachments, manifest = self.plan(
+            project_directory, pages
+        )
+
+        try:
+            # What was downloaded is recorded even if a download fails.
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                page_entries = executor.map(
+                    lambda page: self._download_page(project_directory, page), stale_pages
+                )
+                attachment_entries = executor.map(
+                    lambda a: self._download_attachment(project_directory, a),
+                    stale_attachments,
+                )
+                for page, entry in zip(stale_pages, page_entries):
+                    manifest["pages"][page.title] = entry
+                for attachment, entry in zip(stale_attachments, attachment_entries):
+                    manifest["attachments"][str(attachment.id)] = entry
+        finally:
+            self._save_manifest(project_directory, manifest)
+
+        titles = {page.title for page in pages}
+        removed = [
+            manifest["pages"].pop(title)["file"]
+            for title in manifest["pages"].keys() - titles
+        ]
+        removed += [
+            manifest["attachments"].pop(attachment_id)["filename"]
+            for attachment_id in manifest["attachments"].keys() - set(map(str, attachments))
+        ]
+        if removed:
+            # A file may have been replaced by one of the same name.
+            kept = {entry["file"] for entry in manifest["pages"].values()}
+            kept |= {entry["filename"] for entry in manifest["attachments"].values()}
+            for filename in set(removed) - kept:
+                self._remove(project_directory, filename)
+            self._save_manifest(project_directory, manifest)
+
+        return len(stale_pages), len(stale_attachments)
+
+    @staticmethod
+    def _remove(project_directory, filename):
+        try:
+            os.remove(os.path.join(project_directory, filename))
+        except FileNotFoundError:
+            pass
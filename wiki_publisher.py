@@ -0,0 +1,180 @@
+from wiki_downloader import WikiDownloader
+
+import json
+import os
+import re
+import shutil
+import subprocess
+
+# Redmine's default start page becomes the home page of the GitHub wiki.
+_REDMINE_HOME = "Wiki"
+_GITHUB_HOME = "Home"
+
+# GitHub only shows the master branch of a wiki repository.
+_WIKI_BRANCH = "master"
+
+_ATTACHMENTS = "attachments"
+_PUBLISHED = "published.json"
+
+# [[project:Page#anchor|text]]; anchors are dropped, as GitHub wiki links
+# do not take them.
+_WIKI_LINK = re.compile(
+    r"\[\[(?:(?P<project>[\w-]+):)?(?P<page>[^\]|#:\n]+)"
+    r"(?:#[^\]|\n]+)?(?:\|(?P<text>[^\]\n]+))?\]\]"
+)
+
+
+def page_name(title):
+    """Name of the GitHub wiki page (and of its file, without the .md
+    extension) of a Redmine wiki page."""
+    title = title.strip().replace(" ", "_")
+    return _GITHUB_HOME if title == _REDMINE_HOME else title
+
+
+class WikiPublisher:
+    """Publishes the wiki pages downloaded by download-wikis.py to the wiki
+    repository of a GitHub project.
+
+    Pages are converted to Markdown, with links to other wiki pages and to
+    attachments rewritten, and written into a local clone of the wiki
+    repository together with the attachments.  All changes of a project
+    are committed at once and pushed.  GitHub only creates the wiki
+    repository of a project once its first page is made in the web
+    interface; until then, publishing fails with CalledProcessError.
+
+    Which downloaded pages and attachments were published is recorded next
+    to the download manifest, so that only the files that changed since
+    are converted and written again.
+    """
+
+    def __init__(self, translator, github_org, clone_directory, remote):
+        self._translator = translator
+        self._github_org = github_org
+        self._clone_directory = clone_directory
+        self._remote = remote  # Format string taking the repository name
+
+    def _git(self, clone, *args):
+        return subprocess.run(
+            ["git", "-C", clone, *args], check=True, capture_output=True, text=True
+        ).stdout
+
+    def _clone(self, gh_repo):
+        clone = os.path.join(self._clone_directory, f"{gh_repo}.wiki")
+        if not os.path.isdir(clone):
+            os.makedirs(self._clone_directory, exist_ok=True)
+            subprocess.run(
+                ["git", "clone", "--quiet", self._remote.format(gh_repo), clone],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        else:
+            # Start over from what was last pushed, if anything.
+            self._git(clone, "fetch", "--quiet", "origin")
+            if self._git(clone, "branch", "--remotes"):
+                self._git(clone, "reset", "--quiet", "--hard", "@{upstream}")
+        return clone
+
+    def _link_wiki_pages(self, md):
+        def replace(m):
+            name = page_name(m["page"])
+            text = (m["text"] or m["page"]).strip()
+            if m["project"] is None:
+                return f"[[{text}|{name}]]"
+            # Page of another project's wiki
+            gh_repo = m["project"].replace("_", "-")
+            return f"[{text}](https://github.com/{self._github_org}/{gh_repo}/wiki/{name})"
+
+        return _WIKI_LINK.sub(replace, md)
+
+    def _attachment_urls(self, gh_repo, manifest):
+        # Files of a wiki repository are served from its raw URL.
+        base = f"https://raw.githubusercontent.com/wiki/{self._github_org}/{gh_repo}"
+        return {
+            entry["filename"]: f"{base}/{_ATTACHMENTS}/{entry['filename']}"
+            for entry in manifest["attachments"].values()
+        }
+
+    def convert_page(self, textile_path, gh_repo, attachment_urls):
+        with open(textile_path, encoding="utf-8", newline="") as textile:
+            md = "".join(self._translator.to_md_stream(textile, gh_repo))
+        md = self._translator.link_attachments(md, attachment_urls)
+        return self._link_wiki_pages(md)
+
+    @staticmethod
+    def _load_published(project_directory):
+        try:
+            with open(os.path.join(project_directory, _PUBLISHED)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"pages": {}, "attachments": {}}
+
+    @staticmethod
+    def _save_published(project_directory, published):
+        path = os.path.join(project_directory, _PUBLISHED)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(published, f, indent=2, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+    def changes(self, project_directory, clone):
+        """Returns the downloaded pages and attachments that are not
+        published yet, and those that were published but are gone from the
+        download manifest, as lists of (kind, key, manifest entry, path in
+        the clone), followed by the manifest and the published entries."""
+        manifest = WikiDownloader.load_manifest(project_directory)
+        published = self._load_published(project_directory)
+        paths = {
+            "pages": lambda title, entry: f"{page_name(title)}.md",
+            "attachments": lambda _, entry: f"{_ATTACHMENTS}/{entry['filename']}",
+        }
+        changed, removed = [], []
+        for kind, path in paths.items():
+            for key, entry in manifest[kind].items():
+                target = path(key, entry)
+                if published[kind].get(key) != entry or not os.path.exists(
+                    os.path.join(clone, target)
+                ):
+                    changed.append((kind, key, entry, target))
+            for key in published[kind].keys() - manifest[kind].keys():
+                entry = published[kind][key]
+                removed.append((kind, key, entry, path(key, entry)))
+        return changed, removed, manifest, published
+
+    def publish(self, project_directory, gh_repo, message):
+        """Writes the changes of a project's wiki into its clone, commits
+        them and pushes the commit.  Returns the number of files written
+        and removed, or None if there was nothing to publish."""
+        clone = self._clone(gh_repo)
+        changed, removed, manifest, published = self.changes(project_directory, clone)
+        if not changed and not removed:
+            return None
+
+        attachment_urls = self._attachment_urls(gh_repo, manifest)
+        for kind, key, entry, path in changed:
+            target = os.path.join(clone, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if kind == "pages":
+                md = self.convert_page(
+                    os.path.join(project_directory, entry["file"]), gh_repo, attachment_urls
+                )
+                with open(target, "w", encoding="utf-8", newline="") as f:
+                    f.write(md)
+            else:
+                shutil.copyfile(os.path.join(project_directory, entry["filename"]), target)
+        for kind, key, entry, path in removed:
+            if os.path.exists(os.path.join(clone, path)):
+                self._git(clone, "rm", "--quiet", "--", path)
+
+        self._git(clone, "add", "--all")
+        if self._git(clone, "status", "--porcelain"):
+            self._git(clone, "commit", "--quiet", "--message", message)
+            self._git(
+                clone, "push", "--quiet", "--set-upstream", "origin", f"HEAD:{_WIKI_BRANCH}"
+            )
+
+        for kind, key, entry, _ in changed:
+            published[kind][key] = entry
+        for kind, key, _, _ in removed:
+            del published[kind][key]
+        self._save_published(project_directory, published)
+        return len(changed), len(removed)